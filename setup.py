@@ -11,8 +11,11 @@ with open('shitcord/__init__.py', 'r') as f:
     match = re.search(r'^__version__\s=\s\'(\d.\d.\d([ab])?)\'$', f.read(), re.MULTILINE)
     version = match.group(1)
 
-# No extra requirements at the moment ¯\_(ツ)_/¯
-extra_requires = {}
+extras_require = {
+    'orjson': ['orjson'],
+    'ujson': ['ujson>=5.0'],
+    'asyncio': ['aiohttp>=3.0; python_version >= "3.6"'],
+}
 
 setup(
     name='Shitcord',
@@ -24,10 +27,10 @@ setup(
     long_description_content_type='text/markdown',
     url='https://github.com/itsVale/Shitcord',
     license='GNU General Public License v3 (GPLv3)',
-    packages=['shitcord', 'shitcord.http', 'shitcord.gateway', 'shitcord.models', 'shitcord.events', 'shitcord.utils'],
+    packages=['shitcord', 'shitcord.http', 'shitcord.gateway', 'shitcord.models', 'shitcord.events', 'shitcord.utils', 'shitcord.aio'],
     include_package_data=True,
     install_requires=requirements,
-    extra_requires=extra_requires,
+    extras_require=extras_require,
     classifiers=[
         'Development Status :: 4 - Beta',
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
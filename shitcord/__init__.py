@@ -12,9 +12,13 @@ Though I think this lib could actually be pretty cool...
 :license: GNU GPLv3, see LICENSE for more information
 """
 
-# This has to be here because otherwise it may cause issues
-from gevent import monkey
-monkey.patch_all()
+import os
+
+# This has to be here because otherwise it may cause issues.
+# The asyncio backend doesn't want gevent to patch the standard library under its event loop.
+if os.environ.get('SHITCORD_BACKEND', 'gevent') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
 
 import logging
 import sys
@@ -24,7 +28,8 @@ from .http.api import API
 from .utils.snowflake import *
 from .models import *
 from .gateway import *
-from .client import Client
+from .client import AutoShardedClient, Client
+from .cluster import Cluster
 
 __title__ = 'Shitcord'
 __author__ = 'Valentin B.'
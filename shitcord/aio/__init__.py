@@ -0,0 +1,20 @@
+"""
+An asyncio backend for Shitcord that is built on top of aiohttp.
+
+To use it without gevent patching the whole process, set the environment variable
+`SHITCORD_BACKEND=asyncio` before Shitcord is imported.
+
+It requires Python 3.6 or newer, the rest of Shitcord still runs on 3.4.
+"""
+
+import sys
+
+if sys.version_info < (3, 6):
+    raise ImportError('shitcord.aio requires Python 3.6 or newer.')
+
+from .api import AsyncAPI, AsyncPaginator
+from .client import AsyncClient
+from .gateway import AsyncGatewayClient, AsyncIdentifyScheduler
+from .http import AsyncHTTP, AsyncLimiter
+
+__all__ = ('AsyncAPI', 'AsyncPaginator', 'AsyncClient', 'AsyncGatewayClient', 'AsyncIdentifyScheduler', 'AsyncHTTP', 'AsyncLimiter')
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import time
+import weakref
+from datetime import datetime
+
+from ..http import moderation, pagination
+from ..http.api import API, CapturedResponse
+from ..http.routes import Endpoints, Methods
+from .http import AsyncHTTP
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    _current_task = asyncio.current_task
+except AttributeError:
+    # Python 3.6
+    _current_task = asyncio.Task.current_task
+
+
+class _TaskLocal:
+    """Like `gevent.local.local`, but every asyncio Task has its own attributes."""
+
+    def __init__(self):
+        object.__setattr__(self, '_tasks', weakref.WeakKeyDictionary())
+        object.__setattr__(self, '_outside', {})
+
+    def _attributes(self):
+        try:
+            task = _current_task()
+        except RuntimeError:
+            # There's no running event loop.
+            task = None
+
+        if task is None:
+            return self._outside
+
+        attributes = self._tasks.get(task)
+        if attributes is None:
+            attributes = self._tasks[task] = {}
+
+        return attributes
+
+    def __getattr__(self, name):
+        try:
+            return self._attributes()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._attributes()[name] = value
+
+
+class AsyncPaginator(pagination.Paginator):
+    """
+    The asyncio counterpart of `shitcord.http.pagination.Paginator`.
+    Use it with `async for`, the next page is fetched in a Task while the current one is processed.
+    """
+
+    async def _fetch_page(self, cursor, size):
+        response = await self.fetch(cursor, size)
+        return self.extract(response) if self.extract else response
+
+    def _request(self, cursor, remaining):
+        size = self._page_size(remaining)
+        if self.prefetch:
+            return size, asyncio.ensure_future(self._fetch_page(cursor, size))
+
+        return size, self._fetch_page(cursor, size)
+
+    def __iter__(self):
+        raise TypeError('Use "async for" to iterate over an AsyncPaginator.')
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        remaining = self.limit
+        if remaining is not None and remaining <= 0:
+            return
+
+        size, pending = self._request(self.cursor, remaining)
+
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+
+                if not page:
+                    return
+
+                left = None if remaining is None else remaining - len(page)
+                if len(page) >= size and (left is None or left > 0):
+                    size, pending = self._request(self.next_cursor(page), left)
+
+                for item in page:
+                    if self.stop is not None and self.stop(item):
+                        return
+
+                    yield item
+
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+        finally:
+            if isinstance(pending, asyncio.Future):
+                pending.cancel()
+            elif pending is not None:
+                pending.close()
+
+
+class _AsyncRunner:
+    """Runs coroutines concurrently and records their outcome in a `BulkResult`."""
+
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.result = moderation.BulkResult()
+        self.tasks = []
+
+    async def _run(self, ids, func, *args):
+        try:
+            await func(*args)
+        except Exception as error:
+            logger.debug('Bulk operation for {} failed: {}'.format(ids, error))
+            for id in ids:
+                self.result.failed[id] = error
+        else:
+            self.result.succeeded.extend(ids)
+        finally:
+            self.semaphore.release()
+
+    async def spawn(self, ids, func, *args):
+        # Like a gevent Pool, this waits for a free slot before it schedules anything.
+        await self.semaphore.acquire()
+        self.tasks.append(asyncio.ensure_future(self._run(ids, func, *args)))
+
+    async def join(self):
+        await asyncio.gather(*self.tasks)
+        return self.result
+
+
+class AsyncAPI(API):
+    """
+    The asyncio counterpart of `shitcord.http.API`.
+
+    Every API method returns a coroutine, the `iter_*` methods return asynchronous iterators.
+    It takes the same arguments, which will be passed along to `shitcord.aio.AsyncHTTP`.
+
+    `AsyncAPI.raw_responses` captures the responses of the current Task instead of the current greenlet.
+    """
+
+    http_class = AsyncHTTP
+
+    def __init__(self, token, cache=None, **kwargs):
+        super().__init__(token, cache, **kwargs)
+        self._cache = _TaskLocal()
+
+    async def make_request(self, route, fmt=None, **kwargs):
+        """This will actually be used for HTTP requests to the Discord API."""
+
+        captures = getattr(self._cache, 'captures', None)
+        if not captures:
+            return await self._make_request(route, fmt, **kwargs)
+
+        started = time.monotonic()
+        response = await self._make_request(route, fmt, **kwargs)
+        self._capture_response(captures, CapturedResponse(route, response, time.monotonic() - started))
+
+        return response
+
+    async def _make_request(self, route, fmt=None, **kwargs):
+        fmt = fmt or {}
+        cache = self.cache
+        if cache is None:
+            return await self.http.make_request(route, fmt, **kwargs)
+
+        endpoint = route[1].format(**fmt)
+        if route[0] is not Methods.GET:
+            data = await self.http.make_request(route, fmt, **kwargs)
+            cache.invalidate_path(endpoint)
+            return data
+
+        if not cache.is_cacheable(route, **kwargs):
+            return await self.http.make_request(route, fmt, **kwargs)
+
+        data = cache.get(endpoint)
+        if data is None:
+            version = cache.begin(endpoint)
+            try:
+                data = await self.http.make_request(route, fmt, **kwargs)
+            except BaseException:
+                cache.finish(route, endpoint, version)
+                raise
+
+            cache.finish(route, endpoint, version, data)
+
+        return data
+
+    async def _upload(self, route, fmt, payload, files, **kwargs):
+        body = self._multipart(payload, files)
+        try:
+            return await self.make_request(route, fmt, headers={'Content-Type': body.content_type}, data=body, **kwargs)
+        finally:
+            body.close()
+
+    async def close(self):
+        await self.http.close()
+
+    # ----------------------------------- Iterators ----------------------------------- #
+
+    def iter_guild_members(self, guild_id, after=None, limit=None, prefetch=True):
+        return pagination.guild_members(self, guild_id, after, limit, prefetch, paginator=AsyncPaginator)
+
+    def iter_channel_messages(self, channel_id, before=None, after=None, limit=None, prefetch=True):
+        return pagination.channel_messages(self, channel_id, before, after, limit, prefetch, paginator=AsyncPaginator)
+
+    def iter_guild_audit_log(self, guild_id, user_id=None, action_type=None, before=None, after=None, limit=None, prefetch=True):
+        return pagination.guild_audit_log(self, guild_id, user_id, action_type, before, after, limit, prefetch, paginator=AsyncPaginator)
+
+    # ----------------------------------- Bulk operations ----------------------------------- #
+
+    async def purge_messages(self, channel_id, messages=None, check=None, limit=None, before=None, after=None, concurrency=5):
+        purge = moderation._Purge(self, channel_id)
+        runner = _AsyncRunner(concurrency)
+
+        if messages is not None:
+            for message_id in messages:
+                for deletion in purge.add(message_id):
+                    await runner.spawn(*deletion)
+        else:
+            async for message in self.iter_channel_messages(channel_id, before=before or datetime.utcnow(), after=after, limit=limit):
+                if check is None or check(message):
+                    for deletion in purge.add(message['id']):
+                        await runner.spawn(*deletion)
+
+        for deletion in purge.finish():
+            await runner.spawn(*deletion)
+
+        return await runner.join()
+
+    async def _bulk_member_roles(self, func, guild_id, user_ids, role_id, reason, concurrency):
+        runner = _AsyncRunner(concurrency)
+
+        for user_id in user_ids:
+            await runner.spawn([user_id], func, guild_id, user_id, role_id, reason)
+
+        return await runner.join()
+
+    async def bulk_add_guild_member_role(self, guild_id, user_ids, role_id, reason=None, concurrency=5):
+        return await self._bulk_member_roles(self.add_guild_member_role, guild_id, user_ids, role_id, reason, concurrency)
+
+    async def bulk_remove_guild_member_role(self, guild_id, user_ids, role_id, reason=None, concurrency=5):
+        return await self._bulk_member_roles(self.remove_guild_member_role, guild_id, user_ids, role_id, reason, concurrency)
+
+    # ----------------------------------- Gateway ----------------------------------- #
+
+    async def get_gateway(self):
+        resp = await self.make_request(Endpoints.GET_GATEWAY)
+        logger.debug("Received payload containing Gateway URL {}".format(resp['url']))
+
+        return resp
@@ -0,0 +1,41 @@
+from shitcord.client import Client
+
+from .api import AsyncAPI
+from .gateway import AsyncGatewayClient
+
+
+class AsyncClient(Client):
+    """
+    A `shitcord.Client` that runs on an asyncio event loop instead of gevent.
+
+    Event handlers may be coroutine functions.
+    """
+
+    def __init__(self, api_options=None, **kwargs):
+        # Coroutine handlers are scheduled as Tasks, so they don't hold up the Gateway anyway.
+        super().__init__(api_options, dispatcher=None, **kwargs)
+
+    async def start(self, token: str):
+        """
+        Connects the Client to the API and the Gateway and makes
+        interaction with both elements possible.
+
+        :param token:
+            The bot's token
+        """
+
+        self.api = AsyncAPI(token, **self.api_options)
+        self.gateway_client = await AsyncGatewayClient.from_client(self)
+
+        try:
+            await self.gateway_client.run()
+        finally:
+            await self.api.close()
+
+    def request_members(self, guild_ids, query='', limit=0, presences=False, user_ids=None):
+        """
+        Not supported by the asyncio backend yet, its Gateway can't request guild members.
+        Use `AsyncAPI.iter_guild_members` to load them over HTTP instead.
+        """
+
+        raise NotImplementedError('AsyncClient can\'t request guild members through the Gateway yet, use AsyncAPI.iter_guild_members instead.')
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+
+import aiohttp
+
+from shitcord.events import parser
+from shitcord.gateway.caching import CACHED_EVENTS, store
+from shitcord.gateway.compression import ZlibStream
+from shitcord.gateway.connector import FATAL_CLOSE_CODES, INVALID_SESSION_CLOSE_CODES, RESUMABLE_CLOSE_CODE, GatewayClient
+from shitcord.gateway.opcodes import Opcodes
+from shitcord.gateway.serialization import SERIALIZERS
+from shitcord.gateway.sharding import IdentifyScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncIdentifyScheduler(IdentifyScheduler):
+    """The asyncio counterpart of `shitcord.gateway.IdentifyScheduler`."""
+
+    def __init__(self, max_concurrency=1, total=None, remaining=None, reset_after=0):
+        super().__init__(max_concurrency, total, remaining, reset_after)
+
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def acquire(self, shard_id):
+        """Waits until the shard may IDENTIFY."""
+
+        key = shard_id % self.max_concurrency
+
+        async with self._locks[key]:
+            for delay in self._delays(shard_id, key):
+                await asyncio.sleep(delay)
+
+
+class AsyncGatewayClient:
+    """
+    The asyncio counterpart of `shitcord.gateway.GatewayClient`.
+
+    The WebSocket connection is made with the aiohttp session of the client's `AsyncAPI`.
+    Like the gevent client, it reconnects whenever the connection drops and resumes the session if it can.
+    Event handlers may either be plain functions or coroutine functions, the latter are scheduled as Tasks.
+
+    :param compress:
+        Whether or not to use `zlib-stream` transport compression. Enabled by default.
+    :param encoding:
+        The encoding of the payloads, either `json` or `etf`. Defaults to `json`, which decodes a lot faster.
+        `etf` only makes sense if you want snowflakes as integers.
+    :param shard:
+        A tuple of the shard ID and the shard count. Defaults to a single shard.
+    :param identify_scheduler:
+        A `shitcord.aio.AsyncIdentifyScheduler` that is asked before IDENTIFYing, needed when several shards share a token.
+    :param kwargs:
+        Arguments that will be passed along to `aiohttp.ClientSession.ws_connect`.
+    """
+
+    def __init__(self, client, gateway, compress=True, encoding='json', shard=(0, 1), identify_scheduler=None, **kwargs):
+        self.url = gateway.pop('url')
+        self.shards = gateway.pop('shards')
+        self._session_start_limit = gateway.pop('session_start_limit')
+
+        self.token = client.api.token
+        self.client = client
+        self.compress = compress
+        self.inflator = None
+        self.serializer = SERIALIZERS[encoding]
+        self.shard = tuple(shard)
+        self.identify_scheduler = identify_scheduler
+        self.status = 'connecting'
+        self.kwargs = kwargs
+        self.heart = None
+        self.session_id = None
+        self.seq = None
+
+        self._ws = None
+        self._heartbeat_task = None
+        self._identify_task = None
+        self._acked = True
+        self._last_heartbeat = None
+        self.latencies = deque(maxlen=GatewayClient.LATENCY_SAMPLES)
+
+        # How often a session was resumed and how often a new one had to be started.
+        self.resumes = 0
+        self.identifies = 0
+        self.reconnects = 0
+        self._disconnecting = False
+
+    @classmethod
+    async def from_client(cls, client, gateway=None, **kwargs):
+        """
+        Creates the Gateway connection of a Client. It is made once `AsyncGatewayClient.run` is awaited.
+
+        :param gateway:
+            The response of `AsyncAPI.get_gateway_bot`. It is requested if this is `None`.
+        :param kwargs:
+            Arguments that override the ones of the Client, e.g. `shard`.
+        """
+
+        gateway_data = dict(gateway or await client.api.get_gateway_bot())
+        return cls(client, gateway_data, **dict(client.kwargs, **kwargs))
+
+    shard_id = GatewayClient.shard_id
+    latency = GatewayClient.latency
+    can_resume = GatewayClient.can_resume
+    invalidate_session = GatewayClient.invalidate_session
+
+    async def send(self, payload):
+        if self.serializer.binary:
+            await self._ws.send_bytes(payload)
+        else:
+            await self._ws.send_str(payload)
+
+    async def close(self, code=aiohttp.WSCloseCode.OK):
+        if self._ws is not None:
+            await self._ws.close(code=code)
+
+    async def disconnect(self):
+        """Closes the connection for good. The session can't be resumed afterwards."""
+
+        self._disconnecting = True
+        await self.close()
+
+    async def reconnect(self, resume=True):
+        """
+        Closes the connection, `AsyncGatewayClient.run` opens a new one.
+
+        :param resume:
+            Whether or not to resume the session on the new connection instead of starting a new one.
+        """
+
+        if not resume:
+            self.invalidate_session()
+
+        # aiohttp gives up on the closing handshake after the `timeout` of the connection, so this can't hang.
+        await self.close(RESUMABLE_CLOSE_CODE)
+
+    async def run(self):
+        """
+        Connects to the Gateway and processes its messages.
+
+        Dropped connections are reconnected and their sessions resumed, so this only returns
+        once `AsyncGatewayClient.disconnect` was called or Discord closed the connection for good.
+        """
+
+        url = GatewayClient.gateway_url(self.url, self.compress, self.serializer.encoding)
+        delay = 1
+        connected = False
+
+        while not self._disconnecting:
+            try:
+                self._ws = await self.client.api.http.session.ws_connect(url, **self.kwargs)
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as error:
+                logger.warning('Shard {} failed to connect, retrying in {} seconds: {}'.format(self.shard_id, delay, error))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                continue
+
+            if connected:
+                self.reconnects += 1
+            connected = True
+            delay = 1
+
+            code = await self._poll()
+            logger.debug('WebSocket: Shard {} was disconnected with code {}.'.format(self.shard_id, code))
+
+            if self._disconnecting or code in FATAL_CLOSE_CODES:
+                if not self._disconnecting:
+                    logger.error('Shard {} was closed with code {} and won\'t reconnect.'.format(self.shard_id, code))
+                break
+
+            if code in INVALID_SESSION_CLOSE_CODES:
+                self.invalidate_session()
+
+            self.status = 'reconnecting'
+
+        self.status = 'disconnected'
+
+    join = run
+
+    async def _poll(self):
+        # Every connection starts a new zlib context.
+        self.inflator = ZlibStream() if self.compress else None
+        logger.debug('WebSocket: Successfully connected!')
+
+        try:
+            async for message in self._ws:
+                if message.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                    await self.received_message(message.data)
+                elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+        finally:
+            self._cancel_tasks()
+
+        return self._ws.close_code
+
+    def _cancel_tasks(self):
+        # Neither a heartbeat nor an IDENTIFY must make it onto the next connection.
+        for task in (self._heartbeat_task, self._identify_task):
+            if task is not None:
+                task.cancel()
+
+        self._heartbeat_task = None
+        self._identify_task = None
+
+    async def identify(self):
+        if self.identify_scheduler is not None:
+            await self.identify_scheduler.acquire(self.shard_id)
+
+        logger.debug('Shard {} is identifying.'.format(self.shard_id))
+        self.identifies += 1
+        await self.send(self.serializer.identify(self.token, shard=self.shard))
+
+    async def resume(self):
+        logger.debug('Shard {} is resuming session {} at sequence {}.'.format(self.shard_id, self.session_id, self.seq))
+        self.status = 'resuming'
+        await self.send(self.serializer.resume(self.token, self.session_id, self.seq))
+
+    async def _invalid_session(self, resumable):
+        # Discord wants us to wait a random amount of time between 1 and 5 seconds.
+        await asyncio.sleep(random.uniform(1, 5))
+
+        if resumable and self.can_resume:
+            await self.resume()
+        else:
+            self.invalidate_session()
+            await self.identify()
+
+    async def heartbeat(self):
+        self._last_heartbeat = time.perf_counter()
+        await self.send(self.serializer.heartbeat(d=self.seq))
+
+    async def alive_handler(self, interval):
+        logger.debug('Shard {} starts to send heartbeats every {} seconds.'.format(self.shard_id, interval))
+        await asyncio.sleep(interval * random.random())
+
+        while True:
+            if not self._acked:
+                # The connection is still open, but Discord doesn't listen anymore.
+                logger.warning('Shard {} did not receive a Heartbeat_ACK in time, reconnecting.'.format(self.shard_id))
+
+                # Closing the connection cancels the heartbeat task, which must not happen to this one halfway through.
+                self._heartbeat_task = None
+                await self.reconnect()
+                return
+
+            self._acked = False
+            try:
+                logger.debug('Sending heartbeat.')
+                await self.heartbeat()
+            except (RuntimeError, OSError) as error:
+                # The connection is being replaced.
+                logger.debug('Failed to send heartbeat: {}'.format(error))
+
+            await asyncio.sleep(interval)
+
+    async def received_message(self, data):
+        if self.inflator is not None:
+            data = self.inflator.feed(data)
+            if data is None:
+                return
+
+        message = self.serializer.loads(data)
+        op = Opcodes(message['op'])
+        data = message.get('d')
+        if message.get('s') is not None:
+            self.seq = message['s']
+
+        if op != Opcodes.DISPATCH:
+            logger.debug('Received Response: Sequence number = {}  Opcode = {}'.format(self.seq, op))
+
+            if op == Opcodes.HEARTBEAT_ACK:
+                self._acked = True
+                if self._last_heartbeat is not None:
+                    self.latencies.append(time.perf_counter() - self._last_heartbeat)
+
+            elif op == Opcodes.HEARTBEAT:
+                # Discord wants a heartbeat right away.
+                await self.heartbeat()
+
+            elif op == Opcodes.RECONNECT:
+                logger.debug('Received reconnect opcode.')
+                await self.reconnect()
+
+            elif op == Opcodes.INVALID_SESSION:
+                logger.debug('Session of shard {} was invalidated, resumable: {}'.format(self.shard_id, data))
+                self.status = 'identifying'
+                self._identify_task = asyncio.ensure_future(self._invalid_session(bool(data)))
+
+            elif op == Opcodes.HELLO:
+                self.heart = data.get('heartbeat_interval')
+                self._acked = True
+                self._heartbeat_task = asyncio.ensure_future(self.alive_handler(self.heart / 1000))
+
+                if self.can_resume:
+                    await self.resume()
+                else:
+                    self.status = 'identifying'
+
+                    # Waiting for the scheduler must not block the messages of this connection.
+                    self._identify_task = asyncio.ensure_future(self.identify())
+
+            return
+
+        event = message['t']
+
+        logger.debug('Received Dispatch: event: {}'.format(event))
+        self.fire_event(event.lower(), data)
+
+    def fire_event(self, name, data):
+        if name == 'ready':
+            self.session_id = data['session_id']
+            self.status = 'ready'
+
+        elif name == 'resumed':
+            self.resumes += 1
+            self.status = 'ready'
+            logger.debug('Shard {} resumed its session.'.format(self.shard_id))
+
+        if self.client.api.cache is not None:
+            self.client.api.cache.invalidate_event(name, data)
+
+        for handler in self.client.raw_events.get(name, ()):
+            result = handler(data)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+
+        handlers = self.client.get_handlers(name)
+        if not handlers and name not in CACHED_EVENTS:
+            return
+
+        data = parser.parse_data(name, data)
+
+        store(self.client, data)
+
+        for handler in handlers:
+            result = handler(data)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
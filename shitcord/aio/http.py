@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import copy
+import logging
+import sys
+import time
+
+import aiohttp
+
+import shitcord
+
+from ..http.http import HTTP
+from ..http.metrics import HTTPMetrics
+from ..http.rate_limit import APIResponse, Bucket, Limiter
+from ..http.retry import RetryPolicy
+from ..http.routes import Methods
+from ..http.state import RequestState
+from ..utils import codec
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBucket(Bucket):
+    """A `shitcord.http.rate_limit.Bucket` that is locked with asyncio primitives."""
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.lock = asyncio.Lock()
+        self.settled = asyncio.Event()
+        self.settled.set()
+
+    async def acquire(self):
+        slept = 0.
+        async with self.lock:
+            while True:
+                was_probing = self.probing
+                delay = self.take(time.monotonic())
+                if delay is None:
+                    await self.settled.wait()
+                elif delay > 0:
+                    logger.debug('Bucket {} is exhausted, holding the request for {} seconds.'.format(self.key, delay))
+                    await asyncio.sleep(delay)
+                    slept += delay
+                else:
+                    return slept, self.probing and not was_probing
+
+
+class _Reservation:
+    """The asynchronous counterpart of `Limiter.reserve`."""
+
+    def __init__(self, limiter, bucket):
+        self.limiter = limiter
+        self.bucket = bucket
+        self.locked = False
+        self.probe = False
+
+    async def __aenter__(self):
+        if self.limiter.preemptive:
+            slept, self.probe = await self.bucket.acquire()
+            self.limiter._waited(self.bucket.key, slept)
+        else:
+            await self.bucket.lock.acquire()
+            self.locked = True
+
+        try:
+            await self.limiter.wait_global(self.bucket.key)
+        except BaseException:
+            self._release()
+            raise
+
+        self.bucket.pending += 1
+
+    async def __aexit__(self, *exc_info):
+        self.bucket.pending -= 1
+        self._release()
+
+    def _release(self):
+        if self.locked:
+            self.bucket.lock.release()
+        if self.probe:
+            self.bucket.settle()
+
+
+class AsyncLimiter(Limiter):
+    """A `shitcord.http.Limiter` for the asyncio backend."""
+
+    bucket_class = AsyncBucket
+
+    def __init__(self, preemptive=False):
+        super().__init__(preemptive)
+
+        self.no_global_limit = asyncio.Event()
+        self.no_global_limit.set()
+
+    async def __call__(self, response, bucket):
+        response = APIResponse(response, bucket.key)
+        bucket.update(response)
+
+        if self.preemptive:
+            return self.schedule(response, bucket)
+
+        return await self.cooldown(response)
+
+    def reserve(self, bucket):
+        return _Reservation(self, bucket)
+
+    async def wait_global(self, bucket=None):
+        if not self.no_global_limit.is_set():
+            started = time.monotonic()
+            await self.no_global_limit.wait()
+            self._waited(bucket, time.monotonic() - started, True)
+
+    async def cooldown(self, response):
+        self.check_rate_limit(response)
+
+        if response.is_rate_limited and response.rate_limit_duration > 0:
+            logger.debug('Sleeping for {} seconds due to a rate limit...'.format(response.rate_limit_duration))
+            await asyncio.sleep(response.rate_limit_duration)
+            self._waited(response.bucket, response.rate_limit_duration, self.is_global)
+
+            if self.is_global:
+                self.release_global()
+
+    def schedule(self, response, bucket):
+        self.check_rate_limit(response)
+
+        if response.status_code == 429:
+            bucket.exhaust(response.rate_limit_duration)
+
+            if self.is_global:
+                asyncio.get_event_loop().call_later(response.rate_limit_duration, self.release_global)
+
+
+class _Response:
+    """Gives an aiohttp response the interface of a `requests.Response` that the rest of the library expects."""
+
+    __slots__ = ('status_code', 'headers', 'content', 'request_size')
+
+    def __init__(self, status_code, headers, content, request_size):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.request_size = request_size
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+
+class _Flight:
+    __slots__ = ('result', 'waiters')
+
+    def __init__(self):
+        self.result = asyncio.get_event_loop().create_future()
+        self.waiters = 0
+
+
+def _query_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    return str(value)
+
+
+class AsyncHTTP:
+    """
+    The asyncio counterpart of `shitcord.http.HTTP` that makes requests with aiohttp.
+
+    It takes the same options, except that `session` has to be an `aiohttp.ClientSession`
+    and `limiter` a `shitcord.aio.AsyncLimiter`.
+    """
+
+    BASE_URL = HTTP.BASE_URL
+    MAX_RETRIES = HTTP.MAX_RETRIES
+
+    LOG_SUCCESS = HTTP.LOG_SUCCESS
+    LOG_FAILED = HTTP.LOG_FAILED
+
+    def __init__(self, token, **kwargs):
+        self._token = token
+        self._session = kwargs.get('session')
+
+        max_concurrency = kwargs.get('max_concurrency')
+        self._pool_size = kwargs.get('pool_maxsize', max_concurrency or 50)
+        self._keep_alive = kwargs.get('keep_alive', True)
+        self._concurrency = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        self.limiter = kwargs.get('limiter') or AsyncLimiter(preemptive=kwargs.get('preemptive_rate_limits', False))
+        self.retry_policy = kwargs.get('retry_policy') or RetryPolicy(max_retries=self.MAX_RETRIES)
+
+        self.coalesce_requests = kwargs.get('coalesce_requests', True)
+        self._in_flight = {}
+
+        self.metrics = HTTPMetrics() if kwargs.get('metrics', True) else None
+        self.tracers = []
+        if self.metrics is not None:
+            self.limiter.on_wait = self._rate_limit_waited
+
+        self.headers = self.create_headers(kwargs.get('application_type', 'Bot'))
+
+    create_headers = HTTP.create_headers
+    _rate_limit_waited = HTTP._rate_limit_waited
+    add_tracer = HTTP.add_tracer
+    remove_tracer = HTTP.remove_tracer
+    _retry_after = staticmethod(HTTP._retry_after)
+
+    @staticmethod
+    def create_user_agent():
+        fmt = '{0.__title__} ({0.__url__}, v{0.__version__}) / Python {1[0]}.{1[1]}.{1[2]} / aiohttp {2}'
+        return fmt.format(shitcord, sys.version_info, aiohttp.__version__)
+
+    @property
+    def session(self):
+        # aiohttp wants its sessions to be created inside of a coroutine.
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, force_close=not self._keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @staticmethod
+    def _parse_response(response):
+        if response.headers.get('Content-Type') == 'application/json':
+            return codec.loads(response.content)
+        return response.content
+
+    async def make_request(self, route, fmt=None, **kwargs):
+        """
+        Makes a request to a given endpoint with a shit set of arguments.
+
+        :param route:
+            `shitcord.http.Routes` is what you need. To make sure your endpoint is valid.
+        :param fmt:
+            A dictionary containing all the necessary key-value-pairs to properly format the URL for the request.
+        :param kwargs:
+            Arguments that will be passed along to aiohttp.
+
+        :return:
+            The API's response as a dictionary.
+        """
+
+        fmt = fmt or {}
+
+        if self.coalesce_requests and route[0] is Methods.GET:
+            return await self._coalesced_request(route, fmt, **kwargs)
+
+        return await self._request(route, fmt, **kwargs)
+
+    async def _coalesced_request(self, route, fmt, **kwargs):
+        params = kwargs.get('params')
+        key = (route[1].format(**fmt), tuple(sorted(params.items())) if params else None)
+
+        flight = self._in_flight.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            logger.debug('Joining in-flight request to {}.'.format(key[0]))
+            return copy.deepcopy(await asyncio.shield(flight.result))
+
+        flight = self._in_flight[key] = _Flight()
+        result = flight.result
+        try:
+            data = await self._request(route, fmt, **kwargs)
+        except Exception as error:
+            result.set_exception(error)
+            raise
+        else:
+            # The caller is free to modify the data, so the waiters get a snapshot of it.
+            result.set_result(copy.deepcopy(data) if flight.waiters else data)
+            return data
+        finally:
+            # CancelledError is a BaseException since Python 3.8. The waiters mustn't wait forever if the owner was cancelled.
+            if not result.done():
+                result.set_exception(RuntimeError('The request to {} was cancelled.'.format(key[0])))
+
+            # Nobody might be waiting for an exception, which is fine.
+            result.exception()
+
+            del self._in_flight[key]
+
+    def _prepare(self, kwargs):
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+
+        params = kwargs.get('params')
+        if params:
+            kwargs['params'] = {key: _query_value(value) for key, value in params.items()}
+
+        # aiohttp doesn't know about streamed multipart bodies.
+        body = kwargs.get('data')
+        if hasattr(body, 'rewind'):
+            headers['Content-Length'] = str(len(body))
+            kwargs['data'] = self._stream(body)
+
+        return headers
+
+    @staticmethod
+    async def _stream(body):
+        for chunk in body:
+            yield chunk
+
+    async def _send(self, method, url, headers, **kwargs):
+        async with self.session.request(method, url, headers=headers, **kwargs) as response:
+            content = await response.read()
+
+        request_size = int(headers.get('Content-Length', 0))
+        return _Response(response.status, response.headers, content, request_size)
+
+    async def _request(self, route, fmt, **kwargs):
+        state = RequestState(self, route, fmt)
+        bucket = state.bucket
+
+        body = kwargs.get('data')
+        while True:
+            state.begin()
+            try:
+                if state.retries and hasattr(body, 'rewind'):
+                    body.rewind()
+
+                request = dict(kwargs, data=body) if body is not None else dict(kwargs)
+                headers = self._prepare(request)
+
+                async with self.limiter.reserve(bucket):
+                    state.started()
+                    try:
+                        if self._concurrency is None:
+                            response = await self._send(state.method, state.url, headers, **request)
+                        else:
+                            async with self._concurrency:
+                                response = await self._send(state.method, state.url, headers, **request)
+                    except aiohttp.ClientError as error:
+                        state.failed(error)
+                        raise
+
+                    state.finished(response, response.request_size)
+
+                    await self.limiter(response, bucket)
+
+                data = self._parse_response(response)
+                backoff = state.judge(response, data)
+            finally:
+                state.end()
+
+            if backoff is None:
+                return data
+
+            await asyncio.sleep(backoff)
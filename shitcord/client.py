@@ -1,25 +1,74 @@
 from collections import defaultdict
 
+import gevent
+
 from shitcord import API
 from shitcord import GatewayClient
+from shitcord.gateway.dispatcher import Dispatcher
+from shitcord.gateway.members import MemberRequest
+from shitcord.gateway.sharding import IdentifyScheduler
 from shitcord.models.guild import Guild
 from shitcord.utils.aliases import default_aliases
 from shitcord.utils.cache import Cache
+from shitcord.utils.snowflake import Snowflake
 
 
 class Client:
-    def __init__(self, **kwargs):
+    """
+    :param api_options:
+        Arguments that will be passed along to the `shitcord.http.API` of the Client.
+    :param dispatcher:
+        The `shitcord.gateway.Dispatcher` that runs the event handlers. `True` creates one with the default options,
+        `None` runs the handlers inside of the greenlet that reads from the Gateway.
+    :param kwargs:
+        Arguments that will be passed along to the `shitcord.GatewayClient`.
+    """
+
+    def __init__(self, api_options=None, dispatcher=True, **kwargs):
         self.kwargs = kwargs
+        self.api_options = api_options or {}
+        self.dispatcher = Dispatcher() if dispatcher is True else dispatcher
         self.api = None
         self.gateway_client = None
         self._aliases = default_aliases.copy()
         self.events = defaultdict(list)
+        self.raw_events = defaultdict(list)
         self._guilds = {}
         self._message_cache = Cache()
+        # The members of every guild by user ID, filled by `Client.request_members`.
+        self._members = defaultdict(dict)
+
+        # The handlers of every event, resolved once and thrown away whenever a handler is added.
+        self._handlers = {}
+
+    def __setattr__(self, name, value):
+        if name.startswith('on_') and '_handlers' in self.__dict__:
+            self._handlers.clear()
+
+        super().__setattr__(name, value)
 
     def _resolve_alias(self, event):
         return self._aliases.get(event, event)
 
+    def get_handlers(self, event):
+        """
+        Returns the handlers of an event: The ones registered with `Client.on`,
+        followed by the `on_*` methods for the aliases of the event and the event itself.
+        """
+
+        handlers = self._handlers.get(event)
+        if handlers is None:
+            handlers = list(self.events.get(event, ()))
+
+            for alias in [key for key, value in self._aliases.items() if value == event] + [event]:
+                handler = getattr(self, 'on_' + alias, None)
+                if handler is not None:
+                    handlers.append(handler)
+
+            handlers = self._handlers[event] = tuple(handlers)
+
+        return handlers
+
     def _store_guild(self, guild: Guild):
         self._guilds[guild.id] = guild
 
@@ -34,24 +83,139 @@ class Client:
             The bot's token
         """
 
-        self.api = API(token)
+        self.api = API(token, **self.api_options)
         self.gateway_client = GatewayClient.from_client(self)
 
         self.gateway_client.join()
 
-    def on(self, event: str):
+    def on(self, event: str, raw=False):
         """
         Registers a new event for the Client.
 
         :param event:
             A string that represents the type of the event.
+        :param raw:
+            Whether or not the handler wants the data of the event before it is parsed.
         """
 
         def decorator(func):
-            self.events[self._resolve_alias(event)].append(func)
+            (self.raw_events if raw else self.events)[self._resolve_alias(event)].append(func)
+            self._handlers.clear()
             return func
 
         return decorator
 
     def get_guild(self, id) -> Guild:
         return self._guilds.get(id)
+
+    def get_members(self, guild_id):
+        """Returns a dictionary of the cached members of a guild by user ID."""
+
+        return self._members.get(int(guild_id), {})
+
+    def get_member(self, guild_id, user_id):
+        return self.get_members(guild_id).get(int(user_id))
+
+    def _shard_for(self, guild_id):
+        return self.gateway_client
+
+    def request_members(self, guild_ids, query='', limit=0, presences=False, user_ids=None):
+        """
+        Loads the members of guilds through the Gateway into the member cache.
+        The members of every chunk are cached as soon as it arrives.
+
+        :param guild_ids:
+            The IDs of the guilds.
+        :param query:
+            Only load the members whose username starts with this. An empty string loads all of them.
+        :param limit:
+            The maximum amount of members per guild, `0` for all of them.
+        :param presences:
+            Whether or not Discord should send the presences of the members as well.
+        :param user_ids:
+            Load these members instead of searching with `query`.
+
+        :return:
+            A `shitcord.gateway.MemberRequest`. `MemberRequest.get()` blocks until all chunks arrived.
+        """
+
+        guild_ids = [int(guild_id) for guild_id in guild_ids]
+        request = MemberRequest(self._members, guild_ids)
+
+        shards = defaultdict(list)
+        for guild_id in guild_ids:
+            shards[self._shard_for(guild_id)].append(guild_id)
+
+        for shard, ids in shards.items():
+            shard.request_guild_members(ids, query, limit, presences, user_ids, request=request)
+
+        return request
+
+
+class AutoShardedClient(Client):
+    """
+    A `Client` that runs several shards in a single process.
+
+    Every shard has its own Gateway connection, but the events of all of them end up at the same handlers.
+
+    :param shard_count:
+        The total amount of shards. Defaults to the amount Discord recommends.
+    :param shard_ids:
+        The IDs of the shards to run in this process. Defaults to all of them.
+    :param identify_scheduler:
+        The `shitcord.gateway.IdentifyScheduler` for the shards. By default, one for the session start limit of the token is created.
+    """
+
+    def __init__(self, shard_count=None, shard_ids=None, identify_scheduler=None, api_options=None, dispatcher=True, **kwargs):
+        super().__init__(api_options, dispatcher, **kwargs)
+
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.shards = {}
+        self.identify_scheduler = identify_scheduler
+
+    @property
+    def latencies(self):
+        """A dictionary mapping the shard IDs to the average latency of their heartbeats in seconds."""
+
+        return {shard_id: shard.latency for shard_id, shard in self.shards.items()}
+
+    @property
+    def latency(self):
+        """The average heartbeat latency of all shards in seconds."""
+
+        latencies = [latency for latency in self.latencies.values() if latency is not None]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def _shard_for(self, guild_id):
+        shard_id = Snowflake(guild_id).get_shard_id(self.shard_count)
+        if shard_id not in self.shards:
+            raise LookupError('Shard {} doesn\'t run in this process.'.format(shard_id))
+
+        return self.shards[shard_id]
+
+    @property
+    def shard_status(self):
+        """A dictionary mapping the shard IDs to the status of their connection."""
+
+        return {shard_id: shard.status for shard_id, shard in self.shards.items()}
+
+    def start(self, token: str):
+        """
+        Connects the Client to the API and every shard to the Gateway.
+
+        :param token:
+            The bot's token
+        """
+
+        self.api = API(token, **self.api_options)
+
+        gateway = self.api.get_gateway_bot()
+        self.shard_count = self.shard_count or gateway['shards']
+        self.identify_scheduler = self.identify_scheduler or IdentifyScheduler.from_gateway(gateway)
+
+        for shard_id in self.shard_ids or range(self.shard_count):
+            self.shards[shard_id] = GatewayClient.from_client(self, gateway, shard=(shard_id, self.shard_count),
+                                                              identify_scheduler=self.identify_scheduler)
+
+        gevent.joinall([gevent.spawn(shard.join) for shard in self.shards.values()])
@@ -0,0 +1,417 @@
+"""
+Runs the shards of a bot in several processes, so it can make use of more than one core.
+
+The parent process doesn't connect to the Gateway itself. It decides which shards every worker runs,
+lets the workers IDENTIFY one after another, restarts the ones that crash, shares the rate limits
+of the token between them and receives the events they forward to it.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import struct
+import tempfile
+from collections import defaultdict
+from itertools import count
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.lock import Semaphore
+from gevent.server import StreamServer
+
+from .client import AutoShardedClient
+from .gateway.sharding import IdentifyScheduler
+from .http.api import API
+from .http.shared import RateLimitCoordinator, SharedLimiter
+from .utils.snowflake import Snowflake
+
+logger = logging.getLogger(__name__)
+
+_header = struct.Struct('>I')
+
+
+class _Channel:
+    """Sends and receives pickled messages over a Unix socket. Both ends are processes of the same cluster."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.reader = connection.makefile('rb')
+        self.lock = Semaphore()
+
+    def send(self, *message):
+        data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.connection.sendall(_header.pack(len(data)) + data)
+
+    def receive(self):
+        header = self.reader.read(_header.size)
+        if len(header) < _header.size:
+            return None
+
+        return pickle.loads(self.reader.read(_header.unpack(header)[0]))
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+
+class _RemoteIdentifyScheduler:
+    """Asks the parent process before a shard of a worker may IDENTIFY."""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def acquire(self, shard_id):
+        self.worker.request('identify', shard_id).get()
+
+
+class _Worker:
+    """The part of a cluster that runs inside of a worker process."""
+
+    def __init__(self, worker_id, path):
+        self.worker_id = worker_id
+        self.client = None
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+        self.channel = _Channel(connection)
+
+        self._ids = count()
+        self._pending = {}
+
+    def request(self, kind, *args):
+        request_id = next(self._ids)
+        result = self._pending[request_id] = AsyncResult()
+        self.channel.send(kind, request_id, *args)
+        return result
+
+    def forward(self, name):
+        def handler(data):
+            self.channel.send('event', self.worker_id, name, data)
+
+        return handler
+
+    def listen(self):
+        while True:
+            message = self.channel.receive()
+            if message is None:
+                # Without the parent, there's nobody to coordinate with anymore.
+                logger.error('Worker {} lost the connection to the cluster.'.format(self.worker_id))
+                os._exit(1)
+
+            kind, request_id, *args = message
+            if kind == 'reply':
+                self._pending.pop(request_id).set(args[0])
+            elif kind == 'query':
+                gevent.spawn(self.answer, request_id, *args)
+
+    def answer(self, request_id, func, args):
+        try:
+            value = (True, func(self.client, *args))
+        except Exception as error:
+            value = (False, error)
+
+        try:
+            self.channel.send('reply', request_id, value)
+        except Exception as error:
+            # The return value or the exception can't be pickled.
+            self.channel.send('reply', request_id, (False, RuntimeError(repr(error))))
+
+
+def _run_worker(worker_id, path, limiter_path, client_factory, token, shard_ids, shard_count, forward_events):
+    worker = _Worker(worker_id, path)
+    gevent.spawn(worker.listen)
+    worker.channel.send('hello', worker_id)
+
+    client = worker.client = client_factory()
+    if not isinstance(client, AutoShardedClient):
+        raise TypeError('The client factory of a Cluster has to return an AutoShardedClient.')
+
+    client.shard_ids = shard_ids
+    client.shard_count = shard_count
+    client.identify_scheduler = _RemoteIdentifyScheduler(worker)
+    if limiter_path is not None:
+        client.api_options.setdefault('limiter', SharedLimiter(limiter_path))
+
+    for name in forward_events:
+        client.on(name, raw=True)(worker.forward(name))
+
+    client.start(token)
+
+
+class Cluster:
+    """
+    Splits the shards of a bot into ranges and runs every range in its own process.
+
+    :param client_factory:
+        A function that creates the `shitcord.AutoShardedClient` of a worker and registers its event handlers.
+        It is called inside of the worker, so it has to be defined on module level.
+    :param processes:
+        The amount of worker processes. Defaults to the amount of CPUs.
+    :param shard_count:
+        The total amount of shards. Defaults to the amount Discord recommends.
+    :param forward_events:
+        The names of the events that the workers forward to the handlers of the cluster, see `Cluster.on`.
+    :param restart:
+        Whether or not to restart workers that crashed.
+    :param share_rate_limits:
+        Whether or not the workers share the rate limits of the token through a `shitcord.http.RateLimitCoordinator`.
+    :param api_options:
+        Arguments for the `shitcord.http.API` that the cluster uses to ask for the shard count.
+
+    Workers are started with the `spawn` method of `multiprocessing`,
+    so the script that starts the cluster has to be guarded by `if __name__ == '__main__':`.
+    """
+
+    RESTART_DELAY = 5.
+
+    def __init__(self, client_factory, processes=None, shard_count=None, forward_events=(), restart=True, share_rate_limits=True,
+                 api_options=None):
+        self.client_factory = client_factory
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shard_count = shard_count
+        self.forward_events = tuple(forward_events)
+        self.restart = restart
+        self.share_rate_limits = share_rate_limits
+        self.api_options = api_options or {}
+
+        self.events = defaultdict(list)
+        self.workers = {}
+        self.shard_ids = {}
+        self.restarts = defaultdict(int)
+
+        self.identify_scheduler = None
+        self.coordinator = None
+        self.server = None
+
+        self._token = None
+        self._directory = None
+        self._channels = {}
+        self._ids = count()
+        self._pending = {}
+        self._context = multiprocessing.get_context('spawn')
+
+    def on(self, event: str):
+        """
+        Registers a handler for an event that the workers forward.
+        The handler gets the raw data of the event and the ID of the worker it came from.
+
+        :param event:
+            The name of the event, which has to be in `forward_events`.
+        """
+
+        def decorator(func):
+            self.events[event].append(func)
+            return func
+
+        return decorator
+
+    @property
+    def path(self):
+        return os.path.join(self._directory, 'cluster.sock')
+
+    def worker_for(self, guild_id):
+        """Returns the ID of the worker that runs the shard of a guild."""
+
+        shard_id = Snowflake(int(guild_id)).get_shard_id(self.shard_count)
+        for worker_id, shard_ids in self.shard_ids.items():
+            if shard_id in shard_ids:
+                return worker_id
+
+        raise LookupError('No worker runs shard {}.'.format(shard_id))
+
+    def query(self, guild_id, func, *args, timeout=None):
+        """
+        Asks the worker that owns a guild for some of its state.
+
+        :param func:
+            A function that is called with the worker's client and `args`. It has to be defined on module level
+            and its return value has to be picklable.
+
+        :return:
+            The return value of the function.
+        """
+
+        return self.query_worker(self.worker_for(guild_id), func, *args, timeout=timeout)
+
+    def query_worker(self, worker_id, func, *args, timeout=None):
+        channel = self._channels.get(worker_id)
+        if channel is None:
+            raise LookupError('Worker {} isn\'t connected.'.format(worker_id))
+
+        request_id = next(self._ids)
+        result = self._pending[request_id] = AsyncResult()
+        try:
+            channel.send('query', request_id, func, args)
+            ok, value = result.get(timeout=timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+        if not ok:
+            raise value
+
+        return value
+
+    def split(self, shard_count):
+        """Splits the shards into contiguous ranges, one for every worker."""
+
+        processes = min(self.processes, shard_count)
+        size, rest = divmod(shard_count, processes)
+
+        ranges = {}
+        start = 0
+        for worker_id in range(processes):
+            end = start + size + (1 if worker_id < rest else 0)
+            ranges[worker_id] = list(range(start, end))
+            start = end
+
+        return ranges
+
+    def handle(self, connection, address):
+        channel = _Channel(connection)
+        worker_id = None
+
+        try:
+            while True:
+                message = channel.receive()
+                if message is None:
+                    return
+
+                kind, *args = message
+                if kind == 'hello':
+                    worker_id = args[0]
+                    self._channels[worker_id] = channel
+                    logger.debug('Worker {} connected.'.format(worker_id))
+                elif kind == 'identify':
+                    gevent.spawn(self._identify, channel, *args)
+                elif kind == 'event':
+                    self._dispatch(*args)
+                elif kind == 'reply':
+                    result = self._pending.get(args[0])
+                    if result is not None:
+                        result.set(args[1])
+        except OSError as error:
+            logger.debug('Lost the connection to worker {}: {}'.format(worker_id, error))
+        finally:
+            if worker_id is not None and self._channels.get(worker_id) is channel:
+                del self._channels[worker_id]
+
+            channel.close()
+
+    def _identify(self, channel, request_id, shard_id):
+        self.identify_scheduler.acquire(shard_id)
+        channel.send('reply', request_id, True)
+
+    def _dispatch(self, worker_id, name, data):
+        for handler in self.events[name]:
+            try:
+                handler(data, worker_id)
+            except Exception:
+                logger.exception('Handler for {} failed.'.format(name))
+
+    def spawn(self, worker_id):
+        if self.server is None:
+            # The cluster was stopped while a worker was waiting for its restart.
+            return
+
+        limiter_path = self.coordinator.path if self.coordinator is not None else None
+        args = (worker_id, self.path, limiter_path, self.client_factory, self._token, self.shard_ids[worker_id],
+                self.shard_count, self.forward_events)
+
+        process = self.workers[worker_id] = self._context.Process(target=_run_worker, args=args, name='shitcord-worker-{}'.format(worker_id))
+        process.start()
+        logger.info('Started worker {} with shards {}.'.format(worker_id, self.shard_ids[worker_id]))
+
+    def supervise(self):
+        """Restarts crashed workers until all of them exited."""
+
+        while self.workers:
+            gevent.sleep(1)
+
+            for worker_id, process in list(self.workers.items()):
+                if process.is_alive():
+                    continue
+
+                process.join()
+                if process.exitcode == 0 or not self.restart:
+                    logger.info('Worker {} exited with code {}.'.format(worker_id, process.exitcode))
+                    del self.workers[worker_id]
+                    continue
+
+                self.restarts[worker_id] += 1
+                logger.warning('Worker {} crashed with code {}, restarting it.'.format(worker_id, process.exitcode))
+
+                # Don't burn through the session start limit if a worker crashes right away.
+                gevent.spawn_later(self.RESTART_DELAY, self.spawn, worker_id)
+                self.workers[worker_id] = _Restarting()
+
+    def start(self, token: str):
+        """
+        Starts the workers and blocks until all of them exited.
+
+        :param token:
+            The bot's token
+        """
+
+        self._token = token
+
+        api = API(token, **self.api_options)
+        gateway = api.get_gateway_bot()
+        self.shard_count = self.shard_count or gateway['shards']
+        self.identify_scheduler = IdentifyScheduler.from_gateway(gateway)
+        self.shard_ids = self.split(self.shard_count)
+
+        # Only the user may connect to the sockets.
+        self._directory = tempfile.mkdtemp(prefix='shitcord-')
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(128)
+        self.server = StreamServer(listener, self.handle)
+        self.server.start()
+
+        if self.share_rate_limits:
+            self.coordinator = RateLimitCoordinator(os.path.join(self._directory, 'rate_limits.sock'))
+            self.coordinator.start()
+
+        try:
+            for worker_id in self.shard_ids:
+                self.spawn(worker_id)
+
+            self.supervise()
+        finally:
+            self.stop()
+
+    def stop(self):
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        self.workers.clear()
+
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+        if self.coordinator is not None:
+            self.coordinator.stop()
+            self.coordinator = None
+
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+
+class _Restarting:
+    """Takes the place of a worker process that is about to be restarted."""
+
+    exitcode = None
+
+    def is_alive(self):
+        return True
+
+    def terminate(self):
+        pass
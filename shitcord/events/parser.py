@@ -7,6 +7,7 @@ from shitcord.models import Guild
 parsers = dict(
     guild_create=ModelParser(Guild),
     ready=ModelParser(Ready),
+    resumed=NullParser(),
     presence_update=ModelParser(event_models.PresenceUpdate),
     typing_start=ModelParser(event_models.TypingStart),
     message_create=NullParser(),
@@ -25,7 +26,7 @@ parsers = dict(
     guild_ban_remove=NullParser(),
     guild_member_remove=NullParser(),
     guild_member_add=NullParser(),
-    guild_member_chunk=NullParser(),
+    guild_members_chunk=NullParser(),
     guild_role_create=NullParser(),
     guild_role_update=NullParser(),
     guild_role_delete=NullParser(),
@@ -1,4 +1,7 @@
 from .connector import GatewayClient
+from .dispatcher import Dispatcher
+from .members import MemberRequest
 from .opcodes import Opcodes
+from .sharding import IdentifyScheduler
 
-__all__ = ('GatewayClient', 'Opcodes')
+__all__ = ('Dispatcher', 'GatewayClient', 'IdentifyScheduler', 'MemberRequest', 'Opcodes')
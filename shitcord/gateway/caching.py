@@ -1,5 +1,8 @@
 from shitcord.models.guild import Guild
 
+# The events whose models are stored, so they have to be parsed even if nobody handles them.
+CACHED_EVENTS = frozenset(('guild_create', ))
+
 
 def store(client, obj):
     if isinstance(obj, Guild):
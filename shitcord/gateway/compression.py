@@ -0,0 +1,52 @@
+import zlib
+
+# Every complete payload of a zlib-stream ends with this.
+ZLIB_SUFFIX = b'\x00\x00\xff\xff'
+
+
+class ZlibStream:
+    """
+    Decompresses the payloads of a Gateway connection with `zlib-stream` transport compression.
+
+    All payloads of a connection share one zlib context, so there has to be one `ZlibStream` per connection.
+    A payload may be split into several WebSocket messages, which are buffered until it is complete.
+    The buffer is dropped after every payload, so it never holds more than the largest one.
+    """
+
+    def __init__(self):
+        self._inflator = zlib.decompressobj()
+        self._buffer = bytearray()
+
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+
+    def __repr__(self):
+        return '<ZlibStream compressed={0.compressed_bytes} decompressed={0.decompressed_bytes}>'.format(self)
+
+    @property
+    def ratio(self):
+        """How many times smaller the payloads were on the wire."""
+
+        return self.decompressed_bytes / self.compressed_bytes if self.compressed_bytes else 0.
+
+    def feed(self, data):
+        """
+        Feeds a WebSocket message into the stream.
+
+        :return:
+            The decompressed payload as `bytes`, or `None` if the payload isn't complete yet.
+        """
+
+        self.compressed_bytes += len(data)
+
+        if self._buffer or len(data) < 4 or data[-4:] != ZLIB_SUFFIX:
+            self._buffer.extend(data)
+            if len(self._buffer) < 4 or self._buffer[-4:] != ZLIB_SUFFIX:
+                return None
+
+            data, self._buffer = self._buffer, bytearray()
+
+        payload = self._inflator.decompress(data)
+        self.decompressed_bytes += len(payload)
+
+        return payload
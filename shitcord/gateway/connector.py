@@ -1,113 +1,430 @@
-import json
 import logging
-from datetime import datetime
+import random
+import time
+from collections import deque
 
 import gevent
+from gevent.event import Event
 from ws4py.client.geventclient import WebSocketClient
 from ws4py.messaging import TextMessage
 
 from shitcord.events import parser
-from shitcord.gateway.caching import store
+from shitcord.gateway.caching import CACHED_EVENTS, store
+from shitcord.gateway.compression import ZlibStream
+from shitcord.gateway.dispatcher import dispatch_key
+from shitcord.gateway.members import MemberChunker, MemberRequest
 from shitcord.gateway.opcodes import Opcodes
-from shitcord.gateway.serialization import JSON
+from shitcord.gateway.ratelimit import SendLimiter
+from shitcord.gateway.serialization import SERIALIZERS
 
 logger = logging.getLogger(__name__)
-none_function = lambda *args, **kwargs: None
+
+# Closing a connection with anything but 1000 or 1001 keeps the session alive, so it can be resumed.
+RESUMABLE_CLOSE_CODE = 4000
+# Discord closes the connection with these if reconnecting wouldn't help anyway.
+FATAL_CLOSE_CODES = (4004, 4010, 4011, 4012, 4013, 4014)
+# And with these if the session is gone, but a new one can be started.
+INVALID_SESSION_CLOSE_CODES = (4007, 4009)
 
 
 class GatewayClient(WebSocketClient):
+    """
+    The connection to the Discord Gateway.
+
+    :param compress:
+        Whether or not to use `zlib-stream` transport compression. Enabled by default.
+    :param encoding:
+        The encoding of the payloads, either `json` or `etf`. Defaults to `json`, which decodes a lot faster.
+        `etf` only makes sense if you want snowflakes as integers.
+    :param shard:
+        A tuple of the shard ID and the shard count. Defaults to a single shard.
+    :param identify_scheduler:
+        A `shitcord.gateway.IdentifyScheduler` that is asked before IDENTIFYing, needed when several shards share a token.
+    :param kwargs:
+        Arguments that will be passed along to `ws4py.client.geventclient.WebSocketClient`.
+    """
+
+    # How many heartbeats the latency is averaged over.
+    LATENCY_SAMPLES = 10
 
-    def __init__(self, client, gateway, **kwargs):
+    def __init__(self, client, gateway, compress=True, encoding='json', shard=(0, 1), identify_scheduler=None, **kwargs):
         self.url = gateway.pop('url')
         self.shards = gateway.pop('shards')
         self._session_start_limit = gateway.pop('session_start_limit')
 
-        super().__init__(self.url, **kwargs)
+        self.compress = compress
+        self.inflator = None
+        self.serializer = SERIALIZERS[encoding]
+        self.shard = tuple(shard)
+        self.identify_scheduler = identify_scheduler
+        self.status = 'connecting'
+
+        self._connect_args = (self.gateway_url(self.url, compress, encoding), kwargs)
+        super().__init__(self._connect_args[0], **kwargs)
 
         self.token = client.api.token
         self.client = client
         self.heart = None
         self.session_id = None
         self.seq = None
-        self.latest_ack = None
-        self.latest_heart = None
+
+        # The round trip times of the last heartbeats in seconds.
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self.heartbeat_task = None
+        self._last_heartbeat = None
+        self._acked = True
+        self._stopped = Event()
+
+        # How often a session was resumed and how often a new one had to be started.
+        self.resumes = 0
+        self.identifies = 0
+        self.reconnects = 0
+        self._disconnecting = False
+        self._generation = 0
+
+        self.send_limiter = SendLimiter()
+        self.chunker = MemberChunker(self)
+
         self.connect()
-        self.heartbeat_task = gevent.spawn(self.alive_handler)
 
     @classmethod
-    def from_client(cls, client):
-        gateway_data = client.api.get_gateway_bot()
-        return cls(client, gateway_data, **client.kwargs)
+    def from_client(cls, client, gateway=None, **kwargs):
+        """
+        Connects a Client to the Gateway.
+
+        :param gateway:
+            The response of `API.get_gateway_bot`. It is requested if this is `None`.
+        :param kwargs:
+            Arguments that override the ones of the Client, e.g. `shard`.
+        """
+
+        gateway_data = dict(gateway or client.api.get_gateway_bot())
+        return cls(client, gateway_data, **dict(client.kwargs, **kwargs))
 
     def join(self):
-        self.heartbeat_task.join()
+        """Blocks until the connection is closed for good."""
+
+        self._stopped.wait()
+
+    @staticmethod
+    def gateway_url(url, compress=False, encoding='json'):
+        url += '?v=6&encoding=' + encoding
+        if compress:
+            url += '&compress=zlib-stream'
+
+        return url
+
+    def send(self, payload, binary=None, priority=True):
+        """
+        Sends a payload once the send limit of the Gateway allows it.
+
+        :param priority:
+            Whether or not the payload may use the part of the send limit that is kept for heartbeats and the like.
+            Commands pass `False`, so they can't get the connection closed.
+        """
+
+        self.send_limiter.acquire(priority)
+
+        # ETF payloads have to be sent as binary messages.
+        if binary is None:
+            binary = self.serializer.binary
+
+        super().send(payload, binary)
+
+    def request_guild_members(self, guild_ids, query='', limit=0, presences=False, user_ids=None, request=None):
+        """
+        Requests the members of guilds on this shard through the Gateway, which is a lot faster than paging through them.
+
+        :param guild_ids:
+            The IDs of the guilds. Several of them are requested with a single payload.
+        :param query:
+            Only request the members whose username starts with this. An empty string requests all of them.
+        :param limit:
+            The maximum amount of members per guild, `0` for all of them.
+        :param presences:
+            Whether or not Discord should send the presences of the members as well.
+        :param user_ids:
+            Request these members instead of searching with `query`.
+        :param request:
+            The `shitcord.gateway.MemberRequest` the chunks belong to. A new one is created by default.
+
+        :return:
+            A `shitcord.gateway.MemberRequest` that completes once all chunks arrived.
+        """
+
+        if request is None:
+            request = MemberRequest(self.client._members, guild_ids)
+
+        return self.chunker.request(request, guild_ids, query, limit, presences, user_ids)
+
+    @property
+    def shard_id(self):
+        return self.shard[0]
+
+    @property
+    def latency(self):
+        """The average round trip time of the last heartbeats in seconds, or `None` if none was acknowledged yet."""
+
+        if not self.latencies:
+            return None
+
+        return sum(self.latencies) / len(self.latencies)
+
+    @property
+    def can_resume(self):
+        return self.session_id is not None and self.seq is not None
+
+    def invalidate_session(self):
+        self.session_id = None
+        self.seq = None
+
+    def closed(self, code, reason=None):
+        super().closed(code, reason)
+        logger.debug('WebSocket: Shard {} was disconnected with code {}: {}'.format(self.shard_id, code, reason))
+
+        self.stop_heartbeat()
+
+        if self._disconnecting or code in FATAL_CLOSE_CODES:
+            if not self._disconnecting:
+                logger.error('Shard {} was closed with code {} and won\'t reconnect: {}'.format(self.shard_id, code, reason))
+
+            self.status = 'disconnected'
+            self.chunker.cancel(ConnectionError('Shard {} was closed.'.format(self.shard_id)))
+            self._stopped.set()
+            return
+
+        if code in INVALID_SESSION_CLOSE_CODES:
+            self.invalidate_session()
+
+        self.status = 'reconnecting'
+
+        # This is called while ws4py is still tearing down the old connection.
+        gevent.spawn(self._reconnect)
+
+    def _reconnect(self):
+        delay = 1
+        while not self._disconnecting:
+            try:
+                url, kwargs = self._connect_args
+                WebSocketClient.__init__(self, url, **kwargs)
+                self.connect()
+            except Exception as error:
+                logger.warning('Shard {} failed to reconnect, retrying in {} seconds: {}'.format(self.shard_id, delay, error))
+                gevent.sleep(delay)
+                delay = min(delay * 2, 60)
+            else:
+                self.reconnects += 1
+                return
+
+    def reconnect(self, resume=True):
+        """
+        Closes the connection and opens a new one.
+
+        :param resume:
+            Whether or not to resume the session on the new connection instead of starting a new one.
+        """
+
+        if not resume:
+            self.invalidate_session()
+
+        generation = self._generation
+        self.close(RESUMABLE_CLOSE_CODE)
+
+        # A connection that doesn't answer anymore won't answer to the close frame either.
+        gevent.spawn_later(5, self._force_close, generation)
+
+    def _force_close(self, generation):
+        if self._generation == generation and not self.terminated:
+            logger.debug('Shard {} didn\'t close in time, dropping the connection.'.format(self.shard_id))
+            self.close_connection()
+
+    def disconnect(self):
+        """Closes the connection for good. The session can't be resumed afterwards."""
+
+        self._disconnecting = True
+        self.close()
+
+    def identify(self, generation=None):
+        """
+        Starts a new session.
+
+        :param generation:
+            The connection this was meant for. If it was replaced while the scheduler kept us waiting,
+            the new connection IDENTIFYs by itself and this one is dropped. Sending both gets the connection closed with 4005.
+        """
+
+        if self.identify_scheduler is not None:
+            self.identify_scheduler.acquire(self.shard_id)
+
+        if generation is not None and generation != self._generation:
+            logger.debug('Shard {} reconnected while waiting to IDENTIFY, dropping the stale IDENTIFY.'.format(self.shard_id))
+            return
+
+        logger.debug('Shard {} is identifying.'.format(self.shard_id))
+        self.identifies += 1
+        self.send(self.serializer.identify(self.token, shard=self.shard))
+
+    def resume(self):
+        logger.debug('Shard {} is resuming session {} at sequence {}.'.format(self.shard_id, self.session_id, self.seq))
+        self.status = 'resuming'
+        self.send(self.serializer.resume(self.token, self.session_id, self.seq))
+
+    def _invalid_session(self, resumable, generation):
+        if generation != self._generation:
+            return
+
+        if resumable and self.can_resume:
+            self.resume()
+        else:
+            self.invalidate_session()
+            self.identify(generation)
 
     def opened(self):
-        if self.session_id:
-            self.send(JSON.resume(self.token, self.session_id, self.seq))
-            logger.debug('WebSocket: Successfully connected!')
+        # Every connection starts a new zlib context.
+        self._generation += 1
+        self.inflator = ZlibStream() if self.compress else None
+        self.send_limiter.reset()
+
+        logger.debug('WebSocket: Successfully connected!')
+
+    def start_heartbeat(self, interval):
+        """
+        Starts to send heartbeats every `interval` seconds.
+        The first one is sent after a random fraction of the interval, so shards don't beat in lockstep.
+        """
+
+        self.stop_heartbeat()
+        self._acked = True
+        self.heartbeat_task = gevent.spawn(self.alive_handler, interval)
+
+    def stop_heartbeat(self):
+        if self.heartbeat_task is not None and self.heartbeat_task is not gevent.getcurrent():
+            self.heartbeat_task.kill(block=False)
+
+        self.heartbeat_task = None
+
+    def heartbeat(self):
+        self._last_heartbeat = time.perf_counter()
+        self.send(self.serializer.heartbeat(d=self.seq))
+
+    def alive_handler(self, interval):
+        logger.debug('Shard {} starts to send heartbeats every {} seconds.'.format(self.shard_id, interval))
+        gevent.sleep(interval * random.random())
 
-    def alive_handler(self):
-        logging.debug('Activated Alive Handler!')
         while True:
-            if self.seq and self.heart:
-                if self.latest_ack and self.latest_heart and self.latest_ack < self.latest_heart:
-                    try:
-                        self.send(JSON.resume(self.token, self.session_id, self.seq))
-                    except:
-                        raise RuntimeError("TIMEOUT")
+            if not self._acked:
+                # The connection is still open, but Discord doesn't listen anymore.
+                logger.warning('Shard {} did not receive a Heartbeat_ACK in time, reconnecting.'.format(self.shard_id))
+                self.heartbeat_task = None
+                self.reconnect()
+                return
 
+            self._acked = False
+            try:
                 logger.debug('Sending heartbeat.')
-                self.latest_heart = datetime.now()
-                self.send(JSON.heartbeat(d=self.seq))
+                self.heartbeat()
+            except (RuntimeError, OSError) as error:
+                # The connection is being replaced.
+                logger.debug('Failed to send heartbeat: {}'.format(error))
 
-                gevent.sleep(self.heart / 1000)
-            else:
-                gevent.sleep(0)
+            gevent.sleep(interval)
 
     def received_message(self, message: TextMessage):
-        message = json.loads(message.data.decode(message.encoding))
+        data = message.data
+        if self.inflator is not None:
+            data = self.inflator.feed(data)
+            if data is None:
+                return
+
+        message = self.serializer.loads(data)
         op = Opcodes(message['op'])
         data = message.get('d')
-        self.seq = message.get('s')
+        if message.get('s') is not None:
+            self.seq = message['s']
 
         if op != Opcodes.DISPATCH:
             logger.debug('Received Response: Sequence number = {}  Opcode = {}'.format(self.seq, op))
 
             if op == Opcodes.RECONNECT:
                 logger.debug('Received reconnect opcode.')
+                self.reconnect()
+
+            if op == Opcodes.INVALID_SESSION:
+                logger.debug('Session of shard {} was invalidated, resumable: {}'.format(self.shard_id, data))
+                self.status = 'identifying'
+
+                # Discord wants us to wait a random amount of time between 1 and 5 seconds.
+                gevent.spawn_later(random.uniform(1, 5), self._invalid_session, bool(data), self._generation)
 
             if op == Opcodes.HEARTBEAT_ACK:
                 logger.debug('Received Heartbeat_ACK opcode.')
-                self.latest_ack = datetime.now()
+                self._acked = True
+                if self._last_heartbeat is not None:
+                    self.latencies.append(time.perf_counter() - self._last_heartbeat)
+
+            if op == Opcodes.HEARTBEAT:
+                # Discord wants a heartbeat right away.
+                self.heartbeat()
 
             if op == Opcodes.HELLO:
                 self.heart = data.get('heartbeat_interval')
-                self.send(JSON.identify(self.token))
+                self.start_heartbeat(self.heart / 1000)
+
+                if self.can_resume:
+                    self.resume()
+                else:
+                    self.status = 'identifying'
 
-            if op == Opcodes.RESUME:
-                logger.debug('Resumed!')
-                self.heartbeat_task.kill()
-                self.join()
+                    # Waiting for the scheduler must not block the messages of this connection.
+                    gevent.spawn(self.identify, self._generation)
 
             return
 
         event = message['t']
 
-        logger.debug('Received Dispatch: event: {}'.format(event, data))
+        logger.debug('Received Dispatch: event: {}'.format(event))
         self.fire_event(event.lower(), data)
 
     def fire_event(self, name, data):
         if name == 'ready':
             self.session_id = data['session_id']
+            self.status = 'ready'
 
+            # Requests that were sent in an old session won't be answered anymore.
+            self.chunker.resend()
+
+        elif name == 'resumed':
+            self.resumes += 1
+            self.status = 'ready'
+            logger.debug('Shard {} resumed its session.'.format(self.shard_id))
+            self.chunker.flush()
+
+        elif name == 'guild_members_chunk':
+            # The members are cached right away, so the request completes in order with the chunks.
+            self.chunker.feed(data)
+
+        # This has to happen before the parsers get their hands on the raw data.
+        if self.client.api.cache is not None:
+            self.client.api.cache.invalidate_event(name, data)
+
+        for handler in self.client.raw_events.get(name, ()):
+            handler(data)
+
+        # Building models for events nobody is interested in is a waste of time.
+        handlers = self.client.get_handlers(name)
+        if not handlers and name not in CACHED_EVENTS:
+            return
+
+        dispatcher = self.client.dispatcher
+        if dispatcher is None:
+            self.handle_event(name, data, handlers)
+        else:
+            dispatcher.dispatch(dispatch_key(name, data), self.handle_event, name, data, handlers)
+
+    def handle_event(self, name, data, handlers):
         data = parser.parse_data(name, data)
 
         store(self.client, data)
 
-        for handler in self.client.events[name]:
+        for handler in handlers:
             handler(data)
-
-        # noinspection PyProtectedMember
-        for alias in [key for key, value in self.client._aliases.items() if value == name] + [name]:
-            getattr(self.client, 'on_' + alias, none_function)(data)
@@ -0,0 +1,154 @@
+import logging
+from collections import deque
+from itertools import count
+
+import gevent
+from gevent.queue import Full, Queue
+
+logger = logging.getLogger(__name__)
+
+BLOCK = 'block'
+DROP = 'drop'
+SPILL = 'spill'
+
+
+def dispatch_key(name, data):
+    """Returns the guild or channel an event belongs to. Events of the same key are handled in order."""
+
+    if not isinstance(data, dict):
+        return None
+
+    key = data.get('guild_id') or data.get('channel_id')
+    if key is None and name.startswith('guild_'):
+        # The data of guild_create, guild_update and guild_delete is the guild itself.
+        key = data.get('id')
+
+    return key
+
+
+class _Lane:
+    __slots__ = ('queue', 'spilled', 'worker')
+
+    def __init__(self, size):
+        self.queue = Queue(size)
+        self.spilled = deque()
+        self.worker = None
+
+    def __len__(self):
+        return self.queue.qsize() + len(self.spilled)
+
+
+class Dispatcher:
+    """
+    Runs event handlers outside of the greenlet that reads from the Gateway, so slow handlers can't hold up a shard.
+
+    Events are distributed over a fixed amount of lanes by their guild or channel. Every lane has one greenlet
+    that handles its events one after another, so events of the same guild or channel stay in order
+    while the ones of different guilds are handled concurrently.
+
+    :param workers:
+        The amount of lanes, which is the maximum amount of events that are handled at the same time.
+    :param queue_size:
+        The maximum amount of events that may wait in a lane.
+    :param backpressure:
+        What happens to an event if its lane is full. `spill` (the default) puts it into an unbounded overflow queue,
+        `drop` throws the event away and `block` makes the Gateway wait until there's space. Note that `block` stalls
+        the greenlet that reads from the Gateway, so one slow guild holds up the events of all others on the shard
+        and heartbeats may be missed.
+    """
+
+    def __init__(self, workers=64, queue_size=1000, backpressure=SPILL):
+        if backpressure not in (BLOCK, DROP, SPILL):
+            raise ValueError('Unknown backpressure strategy {!r}.'.format(backpressure))
+
+        self.backpressure = backpressure
+        self.lanes = [_Lane(queue_size) for _ in range(workers)]
+
+        self._round_robin = count()
+
+        self.dispatched = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+
+    def __repr__(self):
+        return '<Dispatcher lanes={} depth={} backpressure={}>'.format(len(self.lanes), self.depth, self.backpressure)
+
+    @property
+    def depth(self):
+        """The amount of events that are waiting to be handled."""
+
+        return sum(len(lane) for lane in self.lanes)
+
+    @property
+    def queue_depths(self):
+        """The amount of events that are waiting in every lane."""
+
+        return [len(lane) for lane in self.lanes]
+
+    @property
+    def stats(self):
+        return dict(dispatched=self.dispatched, dropped=self.dropped, spilled=self.spilled,
+                    depth=self.depth, max_depth=self.max_depth)
+
+    def dispatch(self, key, func, *args):
+        """
+        Queues `func(*args)` in the lane of `key`.
+
+        :param key:
+            The guild or channel ID the call belongs to. Calls without a key don't have to be in order
+            and are spread over all lanes.
+        """
+
+        index = hash(key) if key is not None else next(self._round_robin)
+        lane = self.lanes[index % len(self.lanes)]
+
+        if lane.worker is None:
+            lane.worker = gevent.spawn(self._work, lane)
+
+        item = (func, args)
+
+        # Once something was spilled, everything after it has to wait behind it.
+        if lane.spilled:
+            queued = self._overflow(lane, item)
+        else:
+            try:
+                lane.queue.put(item, block=self.backpressure == BLOCK)
+            except Full:
+                queued = self._overflow(lane, item)
+            else:
+                queued = True
+
+        if queued:
+            self.dispatched += 1
+            self.max_depth = max(self.max_depth, len(lane))
+
+    def _overflow(self, lane, item):
+        """Returns whether the item was kept."""
+
+        if self.backpressure == SPILL:
+            lane.spilled.append(item)
+            self.spilled += 1
+            return True
+
+        self.dropped += 1
+        logger.debug('Dropped an event because its lane is full.')
+        return False
+
+    def _work(self, lane):
+        while True:
+            func, args = lane.queue.get()
+
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('Unhandled exception in an event handler.')
+
+            while lane.spilled and not lane.queue.full():
+                lane.queue.put_nowait(lane.spilled.popleft())
+
+    def close(self):
+        gevent.killall([lane.worker for lane in self.lanes if lane.worker is not None])
+
+        for lane in self.lanes:
+            lane.worker = None
@@ -0,0 +1,205 @@
+import logging
+from itertools import count
+
+import gevent
+from gevent.event import AsyncResult
+
+logger = logging.getLogger(__name__)
+
+
+class MemberRequest:
+    """
+    The handle of a request for the members of one or more guilds.
+
+    The members go into the member cache of the Client as soon as their chunk arrives,
+    the handle only keeps track of how many chunks are still missing.
+    `MemberRequest.get` blocks until all of them arrived and returns the cached members of every guild.
+
+    :param cache:
+        The member cache of the Client, a dictionary mapping guild IDs to dictionaries of members.
+    :param guild_ids:
+        The IDs of the guilds whose members were requested.
+    """
+
+    def __init__(self, cache, guild_ids):
+        self.cache = cache
+        self.guild_ids = [int(guild_id) for guild_id in guild_ids]
+        self.result = AsyncResult()
+
+        # The amount of chunks every guild sends and the indexes of the ones that arrived.
+        self.chunk_counts = {}
+        self.chunks = {guild_id: set() for guild_id in self.guild_ids}
+        self.members = 0
+        self.not_found = []
+
+        self._remaining = set(self.guild_ids)
+
+        if not self._remaining:
+            self.result.set({})
+
+    def __repr__(self):
+        return '<MemberRequest guilds={} members={} done={}>'.format(len(self.guild_ids), self.members, self.ready())
+
+    @property
+    def progress(self):
+        """The fraction of the guilds whose members arrived completely."""
+
+        if not self.guild_ids:
+            return 1.
+
+        return 1 - len(self._remaining) / len(self.guild_ids)
+
+    def ready(self):
+        return self.result.ready()
+
+    def wait(self, timeout=None):
+        return self.result.wait(timeout)
+
+    def get(self, timeout=None):
+        """
+        Blocks until all chunks arrived.
+
+        :return:
+            A dictionary mapping the guild IDs to dictionaries of their members by user ID.
+        """
+
+        return self.result.get(timeout=timeout)
+
+    def complete(self, guild_ids):
+        """Whether or not all chunks of some guilds arrived."""
+
+        return self._remaining.isdisjoint(guild_ids)
+
+    def reset(self, guild_ids):
+        """Forgets the chunks of some guilds because they are requested again."""
+
+        for guild_id in guild_ids:
+            if guild_id in self._remaining:
+                self.chunks[guild_id].clear()
+                self.chunk_counts.pop(guild_id, None)
+
+    def feed(self, guild_id, chunk):
+        if guild_id not in self._remaining:
+            return
+
+        self.members += len(chunk.get('members') or ())
+        self.not_found.extend(chunk.get('not_found') or ())
+
+        self.chunk_counts[guild_id] = chunk.get('chunk_count', 1)
+        self.chunks[guild_id].add(chunk.get('chunk_index', 0))
+
+        if len(self.chunks[guild_id]) >= self.chunk_counts[guild_id]:
+            self._remaining.discard(guild_id)
+
+            if not self._remaining:
+                self.result.set({guild_id: self.cache[guild_id] for guild_id in self.guild_ids})
+
+    def fail(self, error):
+        if not self.ready():
+            self.result.set_exception(error)
+
+
+class MemberChunker:
+    """
+    Requests the members of guilds through the Gateway of a shard and puts the chunks Discord answers with together.
+
+    Several guilds are requested with a single REQUEST_GUILD_MEMBERS payload, and every payload gets a nonce
+    that the chunks come back with, so they can be matched with the request they belong to.
+    """
+
+    # How many guilds are requested with a single payload.
+    GUILDS_PER_REQUEST = 50
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+        self._nonces = count()
+        # The requests that are waiting for chunks, by nonce, together with the guilds and options they were sent with.
+        self.pending = {}
+        # The nonces of the payloads that couldn't be sent because the connection was gone.
+        self.unsent = set()
+
+    def __repr__(self):
+        return '<MemberChunker pending={}>'.format(len(self.pending))
+
+    def request(self, request, guild_ids, query='', limit=0, presences=False, user_ids=None):
+        """
+        Splits the guilds into batches and sends one payload for each of them.
+        The payloads are sent in the background because they have to wait for the send limit of the Gateway.
+        """
+
+        guild_ids = [int(guild_id) for guild_id in guild_ids]
+        options = dict(query=query, limit=limit, presences=presences, user_ids=user_ids)
+
+        nonces = []
+        for start in range(0, len(guild_ids), self.GUILDS_PER_REQUEST):
+            nonce = '{}.{}'.format(self.gateway.shard_id, next(self._nonces))
+            self.pending[nonce] = (request, guild_ids[start:start + self.GUILDS_PER_REQUEST], options)
+            nonces.append(nonce)
+
+        gevent.spawn(self._send, nonces)
+        return request
+
+    def _send(self, nonces):
+        for nonce in nonces:
+            if nonce not in self.pending:
+                continue
+
+            request, guild_ids, options = self.pending[nonce]
+            try:
+                self.gateway.send(self.gateway.serializer.request_guild_members(guild_ids, nonce=nonce, **options), priority=False)
+            except (RuntimeError, OSError) as error:
+                # The payload is sent again once the shard is connected.
+                logger.debug('Failed to request the members of {} guilds: {}'.format(len(guild_ids), error))
+                self.unsent.add(nonce)
+            else:
+                self.unsent.discard(nonce)
+
+    def resend(self):
+        """
+        Requests the members of all pending requests again.
+        Chunks don't survive a new session, so this is needed after every IDENTIFY.
+        """
+
+        if not self.pending:
+            return
+
+        logger.debug('Shard {} requests the members of {} batches again.'.format(self.gateway.shard_id, len(self.pending)))
+        for request, guild_ids, _ in self.pending.values():
+            request.reset(guild_ids)
+
+        gevent.spawn(self._send, list(self.pending))
+
+    def flush(self):
+        """Sends the payloads that failed before. A resumed session still answers the ones that were sent."""
+
+        if self.unsent:
+            gevent.spawn(self._send, list(self.unsent))
+
+    def feed(self, chunk):
+        """Puts the members of a GUILD_MEMBERS_CHUNK into the cache and hands the chunk to its request."""
+
+        guild_id = int(chunk['guild_id'])
+
+        members = self.gateway.client._members[guild_id]
+        for member in chunk.get('members') or ():
+            members[int(member['user']['id'])] = member
+
+        pending = self.pending.get(chunk.get('nonce'))
+        if pending is None:
+            return
+
+        request = pending[0]
+        request.feed(guild_id, chunk)
+
+        if request.complete(pending[1]):
+            del self.pending[chunk['nonce']]
+
+    def cancel(self, error):
+        """Fails all pending requests, e.g. because the connection was closed for good."""
+
+        for request, _, _ in self.pending.values():
+            request.fail(error)
+
+        self.pending.clear()
+        self.unsent.clear()
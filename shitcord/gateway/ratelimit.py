@@ -0,0 +1,77 @@
+import logging
+import time
+from collections import deque
+
+import gevent
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class SendLimiter:
+    """
+    Keeps a connection below the amount of payloads Discord allows to be sent to the Gateway.
+
+    Going over the limit gets the connection closed, so commands like REQUEST_GUILD_MEMBERS wait
+    while only `reserved` payloads are left in the window. Those are kept for heartbeats, IDENTIFY and RESUME.
+
+    :param limit:
+        How many payloads may be sent per window.
+    :param per:
+        The length of the window in seconds.
+    :param reserved:
+        How many payloads of every window are kept for the ones that must not wait.
+    """
+
+    def __init__(self, limit=120, per=60., reserved=5):
+        self.limit = limit
+        self.per = per
+        self.reserved = reserved
+
+        self._sent = deque()
+        self._lock = Semaphore()
+
+    def __repr__(self):
+        return '<SendLimiter {}/{} per {} seconds>'.format(self.remaining, self.limit, self.per)
+
+    @property
+    def remaining(self):
+        self._expire(time.monotonic())
+        return self.limit - len(self._sent)
+
+    def _expire(self, now):
+        while self._sent and self._sent[0] <= now - self.per:
+            self._sent.popleft()
+
+    def acquire(self, priority=False):
+        """
+        Blocks until a payload may be sent and counts it.
+
+        :param priority:
+            Whether or not the payload may use the reserved part of the window.
+        """
+
+        if priority:
+            self._wait(self.limit)
+        else:
+            # Commands are sent in the order they were made, while priority payloads skip the queue.
+            with self._lock:
+                self._wait(self.limit - self.reserved)
+
+    def _wait(self, limit):
+        while True:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._sent) < limit:
+                break
+
+            delay = self._sent[0] + self.per - now
+            logger.debug('Gateway send limit reached, waiting {} seconds.'.format(delay))
+            gevent.sleep(delay)
+
+        self._sent.append(now)
+
+    def reset(self):
+        """Forgets the sent payloads, every connection has its own window."""
+
+        self._sent.clear()
@@ -1,43 +1,59 @@
-import functools
-import json
 import sys
 
 import shitcord
 from .opcodes import Opcodes
-from ..utils.jsonenum import EnumEncoder
+from ..utils import codec, etf
 
 
-def dump(val):
-    return json.dumps(val, cls=EnumEncoder)
+class Serializer:
+    """
+    Builds the payloads that are sent to the Gateway and decodes the ones that are received from it.
 
+    Subclasses set the `encoding` the Gateway is asked for and implement `dumps` and `loads` for it.
+    """
 
-def dump_result(func):
-    @functools.wraps(func)
-    def wrapped(*args, **kwargs):
-        return dump(func(*args, **kwargs))
+    encoding = None
+    # Whether or not the payloads have to be sent as binary WebSocket messages.
+    binary = False
 
-    return wrapped
-
-
-class JSON:
+    @staticmethod
+    def dumps(payload):
+        raise NotImplementedError
 
     @staticmethod
-    @dump_result
-    def heartbeat(d=None):
-        return {
+    def loads(data):
+        raise NotImplementedError
+
+    @classmethod
+    def heartbeat(cls, d=None):
+        return cls.dumps({
             'op': Opcodes.HEARTBEAT,
             'd': d
-        }
+        })
 
-    @staticmethod
-    @dump_result
-    def resume(token, sessid, seq):
-        return dict(token=token, session_id=sessid, seq=seq)
+    @classmethod
+    def resume(cls, token, sessid, seq):
+        return cls.dumps({
+            'op': Opcodes.RESUME,
+            'd': dict(token=token, session_id=sessid, seq=seq)
+        })
 
-    @staticmethod
-    @dump_result
-    def identify(token, game=None):
-        return dict(
+    @classmethod
+    def request_guild_members(cls, guild_ids, query='', limit=0, presences=False, user_ids=None, nonce=None):
+        d = dict(guild_id=list(guild_ids), limit=limit, presences=presences, nonce=nonce)
+        if user_ids is not None:
+            d['user_ids'] = list(user_ids)
+        else:
+            d['query'] = query
+
+        return cls.dumps({
+            'op': Opcodes.REQUEST_GUILD_MEMBERS,
+            'd': d
+        })
+
+    @classmethod
+    def identify(cls, token, game=None, shard=(0, 1)):
+        return cls.dumps(dict(
             op=Opcodes.IDENTIFY,
             d=dict(
                 token=token,
@@ -45,10 +61,45 @@ class JSON:
                     '$os': sys.platform,
                     '$browser': shitcord.__title__,
                     '$device': shitcord.__title__,
-                }
-            ),
-            compress=False,
-            large_threshold=250,
-            shard=[0, 1],
-            presence=game or {"status": "online", "since": 91879201, "afk": False}
-        )
+                },
+                # This is payload compression, which must be off when the whole connection is compressed.
+                compress=False,
+                large_threshold=250,
+                shard=list(shard),
+                presence=game or {"status": "online", "since": 91879201, "afk": False}
+            )
+        ))
+
+
+class JSON(Serializer):
+    encoding = 'json'
+
+    @staticmethod
+    def dumps(payload):
+        return codec.dumps(payload)
+
+    @staticmethod
+    def loads(data):
+        return codec.loads(data)
+
+
+class ETF(Serializer):
+    """
+    Speaks the Erlang External Term Format. Snowflakes are received as integers instead of strings.
+
+    It is a lot slower than `JSON` in Python, see `shitcord.utils.etf`.
+    """
+
+    encoding = 'etf'
+    binary = True
+
+    @staticmethod
+    def dumps(payload):
+        return etf.dumps(payload)
+
+    @staticmethod
+    def loads(data):
+        return etf.loads(data)
+
+
+SERIALIZERS = {serializer.encoding: serializer for serializer in (JSON, ETF)}
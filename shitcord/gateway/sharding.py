@@ -0,0 +1,79 @@
+import logging
+import time
+from collections import defaultdict
+
+import gevent
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class IdentifyScheduler:
+    """
+    Makes sure that shards don't IDENTIFY faster than Discord allows.
+
+    Shards are grouped into `shard_id % max_concurrency` buckets. Every bucket may IDENTIFY once every 5 seconds,
+    and all of them together may only start as many sessions as `session_start_limit` has left.
+
+    :param max_concurrency:
+        How many shards may IDENTIFY at the same time.
+    :param total:
+        How many sessions may be started per day.
+    :param remaining:
+        How many sessions may still be started before the limit resets.
+    :param reset_after:
+        The milliseconds until the limit resets.
+    """
+
+    INTERVAL = 5.
+
+    def __init__(self, max_concurrency=1, total=None, remaining=None, reset_after=0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.total = total if total is not None else remaining
+        self.remaining = remaining
+        self.reset_at = time.monotonic() + reset_after / 1000
+
+        self._locks = defaultdict(Semaphore)
+        self._last = {}
+
+    def __repr__(self):
+        return '<IdentifyScheduler max_concurrency={0.max_concurrency} remaining={0.remaining}>'.format(self)
+
+    @classmethod
+    def from_gateway(cls, gateway):
+        """Creates a scheduler from the response of `API.get_gateway_bot`."""
+
+        limit = gateway.get('session_start_limit') or {}
+        return cls(limit.get('max_concurrency', 1), limit.get('total'), limit.get('remaining'), limit.get('reset_after', 0))
+
+    def acquire(self, shard_id):
+        """Blocks until the shard may IDENTIFY."""
+
+        key = shard_id % self.max_concurrency
+
+        with self._locks[key]:
+            for delay in self._delays(shard_id, key):
+                gevent.sleep(delay)
+
+    def _delays(self, shard_id, key):
+        """Yields the seconds the shard has to sleep before it may IDENTIFY. The caller has to hold the lock of the key."""
+
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                delay = self.reset_at - time.monotonic()
+                if delay > 0:
+                    logger.warning('The session start limit is used up, shard {} has to wait {} seconds.'.format(shard_id, delay))
+                    yield delay
+
+                if self.remaining <= 0:
+                    self.remaining = self.total
+                    self.reset_at = time.monotonic() + 24 * 60 * 60
+
+            self.remaining -= 1
+
+        delay = self._last.get(key, 0.) + self.INTERVAL - time.monotonic()
+        if delay > 0:
+            logger.debug('Shard {} has to wait {} seconds to IDENTIFY.'.format(shard_id, delay))
+            yield delay
+
+        self._last[key] = time.monotonic()
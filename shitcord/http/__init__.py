@@ -1,7 +1,18 @@
-from .api import API
-from .errors import ShitRequestFailedError
+from .api import API, CapturedResponse
+from .cache import ResponseCache
+from .errors import CircuitOpenError, ShitRequestFailedError
 from .http import HTTP
+from .metrics import HTTPMetrics
+from .multipart import File, MultipartStream
+from .outbox import MessageQueue
 from .rate_limit import Limiter
+from .retry import CircuitBreaker, RetryBudget, RetryPolicy
+from .shared import RateLimitCoordinator, SharedLimiter
 from .routes import Endpoints, Methods
+from .tracing import Tracer
+from .webhooks import WebhookExecutor
 
-__all__ = ('Endpoints', 'Methods', 'Limiter', 'HTTP', 'ShitRequestFailedError', 'API')
+__all__ = ('Endpoints', 'Methods', 'Limiter', 'HTTP', 'ShitRequestFailedError', 'API', 'CapturedResponse', 'ResponseCache',
+           'CircuitOpenError', 'CircuitBreaker', 'RetryBudget', 'RetryPolicy', 'File', 'MultipartStream',
+           'HTTPMetrics', 'Tracer', 'RateLimitCoordinator', 'SharedLimiter', 'WebhookExecutor',
+           'MessageQueue')
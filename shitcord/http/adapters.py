@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    A transport adapter for the requests library that keeps a pool of connections to the Discord API.
+
+    :param keep_alive:
+        Whether or not to enable TCP keep-alive on the pooled connections, so idle connections don't silently die.
+    :param kwargs:
+        Arguments that will be passed along to `requests.adapters.HTTPAdapter`, e.g. `pool_maxsize`.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['keep_alive']
+
+    def __init__(self, keep_alive=True, **kwargs):
+        # This has to be set before the parent class initializes the pool manager.
+        self.keep_alive = keep_alive
+
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keep_alive:
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+        super().init_poolmanager(*args, **kwargs)
+
+    def connection_stats(self):
+        """
+        Counts how many connections had to be established and how many requests reused a pooled connection.
+
+        :return:
+            A dictionary with the keys `requests`, `new_connections` and `reused_connections`.
+        """
+
+        requests = connections = 0
+
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            requests += pool.num_requests
+            connections += pool.num_connections
+
+        return dict(requests=requests, new_connections=connections, reused_connections=max(0, requests - connections))
@@ -1,21 +1,41 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import time
+from . import moderation, pagination
+from .cache import ResponseCache
 from .http import HTTP
+from .multipart import File, MultipartStream
+from ..utils import codec
 from .routes import Endpoints
 from gevent.local import local
-import json
+from collections import deque, namedtuple
 from contextlib import contextmanager
 from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
+# A response captured by `API.raw_responses`, with the route it came from and the seconds the request took.
+CapturedResponse = namedtuple('CapturedResponse', 'route response elapsed')
 
-class API:
-    """This represents an API client for making requests to the Discord REST API."""
 
-    def __init__(self, token):
-        self.http = HTTP(token)
+class API:
+    """
+    This represents an API client for making requests to the Discord REST API.
+
+    :param token:
+        The bot's token.
+    :param cache:
+        Either `True` or a `shitcord.http.ResponseCache` to cache the responses of read endpoints. Disabled by default.
+    :param kwargs:
+        Arguments that will be passed along to `shitcord.http.HTTP`.
+    """
+
+    http_class = HTTP
+
+    def __init__(self, token, cache=None, **kwargs):
+        self.http = self.http_class(token, **kwargs)
+        self.cache = ResponseCache() if cache is True else cache
         self._cache = local()
 
     @property
@@ -25,33 +45,59 @@ class API:
     def make_request(self, route, fmt=None, **kwargs):
         """This will actually be used for HTTP requests to the Discord API."""
 
-        response = self.http.make_request(route, fmt, **kwargs)
-        self._capture_response(response)
+        captures = getattr(self._cache, 'captures', None)
+        if not captures:
+            return self._make_request(route, fmt, **kwargs)
+
+        started = time.monotonic()
+        response = self._make_request(route, fmt, **kwargs)
+        self._capture_response(captures, CapturedResponse(route, response, time.monotonic() - started))
 
         return response
 
-    def _capture_response(self, response):
-        if not hasattr(self._cache, 'responses'):
-            self._cache.responses = []
+    def _make_request(self, route, fmt=None, **kwargs):
+        if self.cache is not None:
+            return self.cache.request(self.http, route, fmt, **kwargs)
 
-        self._cache.responses.append(response)
-        logger.debug('Added response {} to cache.'.format(response))
+        return self.http.make_request(route, fmt, **kwargs)
+
+    @staticmethod
+    def _capture_response(captures, captured):
+        for responses in captures:
+            responses.append(captured)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Captured response {}.'.format(captured))
 
     @contextmanager
-    def raw_responses(self):
+    def raw_responses(self, maxlen=None):
         """
-        A Context Manager that captures all responses from the requests that were made.
-        It can be used to view raw API responses for example.
+        A Context Manager that captures all responses from the requests that were made by the current greenlet
+        inside of its block. It can be used to view raw API responses for example.
+
+        Responses are only captured while a block is active, so this costs nothing outside of it.
 
         PLEASE DO ONLY USE THIS IF YOU KNOW WHAT YOU ARE DOING!
+
+        :param maxlen:
+            If given, only the last `maxlen` responses are kept in a ring buffer. Useful for long-running greenlets.
+
+        :return:
+            A list (or a `collections.deque` if `maxlen` is given) of `CapturedResponse`s.
         """
 
-        responses = self._cache.responses
+        responses = [] if maxlen is None else deque(maxlen=maxlen)
+
+        captures = getattr(self._cache, 'captures', None)
+        if captures is None:
+            captures = self._cache.captures = []
 
+        captures.append(responses)
         try:
             yield responses
         finally:
-            delattr(self._cache, 'responses')
+            # Empty buffers compare equal, so this has to go by identity.
+            captures[:] = [buffer for buffer in captures if buffer is not responses]
 
     @staticmethod
     def _optional(**kwargs):
@@ -162,6 +208,22 @@ class API:
             after=after,
         ))
 
+    def iter_guild_members(self, guild_id, after=None, limit=None, prefetch=True):
+        """
+        Iterates over all members of a guild while the next page is already fetched in the background.
+
+        :param guild_id:
+            The ID of the guild.
+        :param after:
+            A user ID or datetime to start after.
+        :param limit:
+            The maximum amount of members to yield. `None` for all of them.
+        :param prefetch:
+            Whether or not to fetch the next page while the current one is processed.
+        """
+
+        return iter(pagination.guild_members(self, guild_id, after, limit, prefetch))
+
     def add_guild_member(self, guild_id, user_id, access_token, nick=None, roles=None, mute=None, deaf=None):
         payload = {
             'access_token': access_token,
@@ -195,6 +257,48 @@ class API:
         return self.make_request(Endpoints.REMOVE_GUILD_MEMBER_ROLE, dict(guild=guild_id, user=user_id, role=role_id),
                                  headers=self._reason_header(reason))
 
+    def bulk_add_guild_member_role(self, guild_id, user_ids, role_id, reason=None, concurrency=5):
+        """
+        Adds a role to any amount of guild members.
+
+        :param guild_id:
+            The ID of the guild.
+        :param user_ids:
+            An iterable of the IDs of the members.
+        :param role_id:
+            The ID of the role.
+        :param reason:
+            The reason for the audit log.
+        :param concurrency:
+            How many requests may run at the same time.
+
+        :return:
+            A `shitcord.http.moderation.BulkResult`.
+        """
+
+        return moderation.add_member_roles(self, guild_id, user_ids, role_id, reason, concurrency)
+
+    def bulk_remove_guild_member_role(self, guild_id, user_ids, role_id, reason=None, concurrency=5):
+        """
+        Removes a role from any amount of guild members.
+
+        :param guild_id:
+            The ID of the guild.
+        :param user_ids:
+            An iterable of the IDs of the members.
+        :param role_id:
+            The ID of the role.
+        :param reason:
+            The reason for the audit log.
+        :param concurrency:
+            How many requests may run at the same time.
+
+        :return:
+            A `shitcord.http.moderation.BulkResult`.
+        """
+
+        return moderation.remove_member_roles(self, guild_id, user_ids, role_id, reason, concurrency)
+
     def remove_guild_member(self, guild_id, user_id, reason=None):
         return self.make_request(Endpoints.REMOVE_GUILD_MEMBER, dict(guild=guild_id, user=user_id), headers=self._reason_header(reason))
 
@@ -337,6 +441,24 @@ class API:
             limit=limit,
         ))
 
+    def iter_channel_messages(self, channel_id, before=None, after=None, limit=None, prefetch=True):
+        """
+        Iterates over the message history of a channel while the next page is already fetched in the background.
+
+        :param channel_id:
+            The ID of the channel.
+        :param before:
+            A message ID or datetime to start before. Messages are yielded from the newest to the oldest one.
+        :param after:
+            A message ID or datetime to stop at. If `before` isn't given, messages are yielded from the oldest to the newest one instead.
+        :param limit:
+            The maximum amount of messages to yield. `None` for all of them.
+        :param prefetch:
+            Whether or not to fetch the next page while the current one is processed.
+        """
+
+        return iter(pagination.channel_messages(self, channel_id, before, after, limit, prefetch))
+
     def get_channel_message(self, channel_id, message_id):
         return self.make_request(Endpoints.GET_CHANNEL_MESSAGE, dict(channel=channel_id, message=message_id))
 
@@ -353,20 +475,34 @@ class API:
             payload['embed'] = embed
 
         if files:
-            if len(files) == 1:
-                attachments = {
-                    'file': tuple(files[0]),
-                }
-            else:
-                attachments = {
-                    'file{}'.format(index): tuple(file) for index, file in enumerate(files)
-                }
-
-            return self.make_request(Endpoints.CREATE_MESSAGE, dict(channel=channel_id), files=attachments,
-                                     data={'payload_json': json.dumps(payload)})
+            return self._upload(Endpoints.CREATE_MESSAGE, dict(channel=channel_id), payload, files)
 
         return self.make_request(Endpoints.CREATE_MESSAGE, dict(channel=channel_id), json=payload)
 
+    def _upload(self, route, fmt, payload, files, **kwargs):
+        """
+        Makes a request with files attached to it. The files are streamed from their source instead of being read into memory.
+
+        :param files:
+            A list of `shitcord.http.File`s, paths, file objects, buffers or `(filename, source[, content_type])` tuples.
+        """
+
+        body = self._multipart(payload, files)
+        try:
+            return self.make_request(route, fmt, headers={'Content-Type': body.content_type}, data=body, **kwargs)
+        finally:
+            body.close()
+
+    @staticmethod
+    def _multipart(payload, files):
+        files = [File.coerce(file) for file in files]
+        if len(files) == 1:
+            attachments = {'file': files[0]}
+        else:
+            attachments = {'file{}'.format(index): file for index, file in enumerate(files)}
+
+        return MultipartStream({'payload_json': codec.dumps(payload)}, attachments)
+
     def create_reaction(self, channel_id, message_id, unicode):
         return self.make_request(Endpoints.CREATE_REACTION, dict(channel=channel_id, message=message_id, emoji=unicode))
 
@@ -394,6 +530,33 @@ class API:
     def bulk_delete_messages(self, channel_id, messages=None):
         return self.http.make_request(Endpoints.BULK_DELETE_MESSAGES, dict(channel=channel_id), json=self._optional(messages=messages))
 
+    def purge_messages(self, channel_id, messages=None, check=None, limit=None, before=None, after=None, concurrency=5):
+        """
+        Deletes any amount of messages, either given by their IDs or searched in the channel's history.
+
+        Messages younger than 14 days are bulk deleted in chunks of 100, older ones are deleted one by one.
+
+        :param channel_id:
+            The ID of the channel.
+        :param messages:
+            An iterable of message IDs. If this is `None`, the channel's history is searched instead.
+        :param check:
+            A function that takes a message from the history and returns whether it should be deleted.
+        :param limit:
+            The maximum amount of messages to search in the history.
+        :param before:
+            A message ID or datetime to start searching the history before.
+        :param after:
+            A message ID or datetime to stop searching the history at.
+        :param concurrency:
+            How many single deletions may run at the same time.
+
+        :return:
+            A `shitcord.http.moderation.BulkResult`.
+        """
+
+        return moderation.purge_messages(self, channel_id, messages, check, limit, before, after, concurrency)
+
     def edit_channel_permissions(self, channel_id, overwrite_id, allow=None, deny=None, permissions_type=None, reason=None):
         return self.http.make_request(Endpoints.EDIT_CHANNEL_PERMISSIONS, dict(channel=channel_id, permissions=overwrite_id),
                                       headers=self._reason_header(reason), json=self._optional(
@@ -447,6 +610,29 @@ class API:
             limit=limit,
         ))
 
+    def iter_guild_audit_log(self, guild_id, user_id=None, action_type=None, before=None, after=None, limit=None, prefetch=True):
+        """
+        Iterates over the audit log entries of a guild from the newest to the oldest one
+        while the next page is already fetched in the background.
+
+        :param guild_id:
+            The ID of the guild.
+        :param user_id:
+            Only yield entries of actions made by this user.
+        :param action_type:
+            Only yield entries of this type of action.
+        :param before:
+            An entry ID or datetime to start before.
+        :param after:
+            An entry ID or datetime to stop at.
+        :param limit:
+            The maximum amount of entries to yield. `None` for all of them.
+        :param prefetch:
+            Whether or not to fetch the next page while the current one is processed.
+        """
+
+        return iter(pagination.guild_audit_log(self, guild_id, user_id, action_type, before, after, limit, prefetch))
+
     # ----------------------------------- Emoji ----------------------------------- #
 
     def list_guild_emojis(self, guild_id):
@@ -567,15 +753,18 @@ class API:
 
     def execute_webhook(self, webhook_id, webhook_token, content=None, username=None, avatar_url=None, tts=None, file=None, embeds=None, wait=False):
         params = {'wait': int(wait)}
-
-        return self.make_request(Endpoints.EXECUTE_WEBHOOK, dict(webhook=webhook_id, token=webhook_token), params=params, json=self._optional(
+        payload = self._optional(
             content=content,
             username=username,
             avatar_url=avatar_url,
             tts=tts,
-            file=file,
             embeds=embeds,
-        ))
+        )
+
+        if file is not None:
+            return self._upload(Endpoints.EXECUTE_WEBHOOK, dict(webhook=webhook_id, token=webhook_token), payload, [file], params=params)
+
+        return self.make_request(Endpoints.EXECUTE_WEBHOOK, dict(webhook=webhook_id, token=webhook_token), params=params, json=payload)
 
     def execute_slack_compatible_webhook(self, webhook_id, webhook_token):
         return self.make_request(Endpoints.EXECUTE_SLACK_COMPATIBLE_WEBHOOK, dict(webhook=webhook_id, token=webhook_token))
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import logging
+import time
+from collections import OrderedDict
+
+from .routes import Endpoints, Methods
+
+logger = logging.getLogger(__name__)
+
+# Time-to-live in seconds of the routes that are cached by default.
+DEFAULT_TTLS = {
+    Endpoints.GET_GUILD: 60,
+    Endpoints.GET_GUILD_ROLES: 60,
+    Endpoints.GET_GUILD_CHANNELS: 60,
+    Endpoints.GET_CHANNEL: 60,
+    Endpoints.GET_USER: 300,
+}
+
+
+class ResponseCache:
+    """
+    A size bounded cache for responses of read endpoints.
+
+    Entries expire after the TTL of their route and are invalidated when the
+    bot modifies the resource or the Gateway tells us that something has changed.
+
+    :param max_size:
+        The maximum amount of responses to keep. The least recently used ones are dropped first.
+    :param ttls:
+        A dictionary mapping routes to their TTL in seconds. Overrides the defaults, a TTL of `None` disables caching for a route.
+    """
+
+    def __init__(self, max_size=5000, ttls=None):
+        self.max_size = max_size
+        self.ttls = DEFAULT_TTLS.copy()
+        self.ttls.update(ttls or {})
+
+        self._entries = OrderedDict()
+        # The endpoints that are being requested, mapped to [invalidations, requests].
+        # A response that was invalidated while it was on its way is stale and must not be cached.
+        self._in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+    def is_cacheable(self, route, **kwargs):
+        return self.ttls.get(route) is not None and not kwargs.get('params')
+
+    def get(self, endpoint):
+        """Returns a copy of the cached response for a formatted endpoint or `None` if there is none."""
+
+        entry = self._entries.get(endpoint)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(endpoint)
+        self.hits += 1
+
+        # Models modify the data they are created from, so this should never be handed out directly.
+        return copy.deepcopy(entry[1])
+
+    def put(self, route, endpoint, data):
+        self._entries[endpoint] = (time.monotonic() + self.ttls[route], copy.deepcopy(data))
+        self._entries.move_to_end(endpoint)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint):
+        """Drops the cached response of a formatted endpoint."""
+
+        flight = self._in_flight.get(endpoint)
+        if flight is not None:
+            flight[0] += 1
+
+        if self._entries.pop(endpoint, None) is not None:
+            logger.debug('Invalidated cached response for {}.'.format(endpoint))
+
+    def invalidate_path(self, endpoint):
+        """Drops the responses of a formatted endpoint and all endpoints above it, e.g. `/guilds/1` for `/guilds/1/roles/2`."""
+
+        parts = endpoint.split('/')
+        for index in range(2, len(parts) + 1):
+            self.invalidate('/'.join(parts[:index]))
+
+    def clear(self):
+        self._entries.clear()
+
+        for flight in self._in_flight.values():
+            flight[0] += 1
+
+    def invalidate_event(self, event, data):
+        """
+        Invalidates the responses a Gateway dispatch makes stale.
+
+        :param event:
+            The lowercase name of the event, e.g. `guild_update`.
+        :param data:
+            The raw payload of the event.
+        """
+
+        if not isinstance(data, dict):
+            return
+
+        if event in ('guild_update', 'guild_delete'):
+            self._invalidate_guild(data['id'], everything=event == 'guild_delete')
+
+        elif event in ('channel_create', 'channel_update', 'channel_delete'):
+            self.invalidate(Endpoints.GET_CHANNEL[1].format(channel=data['id']))
+            if data.get('guild_id'):
+                self.invalidate(Endpoints.GET_GUILD_CHANNELS[1].format(guild=data['guild_id']))
+
+        elif event in ('guild_role_create', 'guild_role_update', 'guild_role_delete'):
+            # The guild object contains the roles too.
+            self.invalidate(Endpoints.GET_GUILD_ROLES[1].format(guild=data['guild_id']))
+            self.invalidate(Endpoints.GET_GUILD[1].format(guild=data['guild_id']))
+
+        elif event in ('guild_emojis_update', 'guild_integrations_update'):
+            self.invalidate(Endpoints.GET_GUILD[1].format(guild=data['guild_id']))
+
+        elif event == 'user_update':
+            self.invalidate(Endpoints.GET_USER[1].format(user=data['id']))
+
+    def _invalidate_guild(self, guild_id, everything=False):
+        self.invalidate(Endpoints.GET_GUILD[1].format(guild=guild_id))
+
+        if everything:
+            self.invalidate(Endpoints.GET_GUILD_ROLES[1].format(guild=guild_id))
+            self.invalidate(Endpoints.GET_GUILD_CHANNELS[1].format(guild=guild_id))
+
+    def request(self, http, route, fmt=None, **kwargs):
+        """Makes a request through the cache."""
+
+        fmt = fmt or {}
+        endpoint = route[1].format(**fmt)
+
+        if route[0] is not Methods.GET:
+            data = http.make_request(route, fmt, **kwargs)
+            self.invalidate_path(endpoint)
+            return data
+
+        if not self.is_cacheable(route, **kwargs):
+            return http.make_request(route, fmt, **kwargs)
+
+        data = self.get(endpoint)
+        if data is None:
+            version = self.begin(endpoint)
+            try:
+                data = http.make_request(route, fmt, **kwargs)
+            except BaseException:
+                self.finish(route, endpoint, version)
+                raise
+
+            self.finish(route, endpoint, version, data)
+
+        return data
+
+    def begin(self, endpoint):
+        """
+        Called before an endpoint that missed the cache is requested.
+
+        :return:
+            The version that has to be passed to `ResponseCache.finish`.
+        """
+
+        flight = self._in_flight.setdefault(endpoint, [0, 0])
+        flight[1] += 1
+        return flight[0]
+
+    def finish(self, route, endpoint, version, data=None):
+        """Caches the response of a request that was started with `ResponseCache.begin`, unless it was invalidated in the meantime."""
+
+        flight = self._in_flight[endpoint]
+        flight[1] -= 1
+        if not flight[1]:
+            del self._in_flight[endpoint]
+
+        if data is None:
+            return
+
+        if flight[0] == version:
+            self.put(route, endpoint, data)
+        else:
+            logger.debug('Not caching the response for {}, it was invalidated in the meantime.'.format(endpoint))
@@ -30,3 +30,13 @@ class ShitRequestFailedError(Exception):
             self.failed += '\nHere\'s a bunch of errors for you. Have fun with that crap:\n' + error_list
 
         super().__init__(self.failed.format(self))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request to a bucket that keeps failing with server errors."""
+
+    def __init__(self, bucket, retry_in):
+        self.bucket = bucket
+        self.retry_in = retry_in
+
+        super().__init__('Discord keeps shitting itself on {}, not even trying for the next {:.2f} seconds.'.format(bucket, retry_in))
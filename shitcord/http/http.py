@@ -1,13 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import logging
 import shitcord
 from . import rate_limit
-from .errors import ShitRequestFailedError
+from .adapters import PooledAdapter
+from ..utils import codec
+from .metrics import HTTPMetrics
+from .retry import RetryPolicy
+from .routes import Methods
+from .state import RequestState
 import requests
 import gevent
+from gevent.event import AsyncResult
+from gevent.lock import BoundedSemaphore
 import sys
-from random import randint
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +23,26 @@ class HTTP:
     """
     This represents a shitty HTTP client that wraps around the requests library and makes all the requests to the Discord API, handles rate limits
     as well and parses the responses.
+
+    :param token:
+        The bot's token. Can be `None` for endpoints that don't need one, like executing webhooks.
+    :param session:
+        A `requests.Session` to use instead of the pooled one the client creates by itself.
+    :param pool_maxsize:
+        How many connections to the API are kept open for reuse. Defaults to `max_concurrency` if that is set, otherwise 50.
+    :param pool_block:
+        Whether or not requests wait for a pooled connection instead of opening a throwaway one when the pool is exhausted.
+    :param keep_alive:
+        Whether or not to enable TCP keep-alive on the pooled connections.
+    :param max_concurrency:
+        The maximum amount of requests that may be on their way at the same time. Unbounded by default.
+    :param limiter:
+        A `shitcord.http.Limiter` to keep track of the rate limits, e.g. a `shitcord.http.SharedLimiter`
+        to share them with other processes. Overrides `preemptive_rate_limits`.
+    :param retry_policy:
+        A `shitcord.http.RetryPolicy` that decides whether and when failed requests are retried.
+    :param metrics:
+        Whether or not to collect `shitcord.http.HTTPMetrics` about the requests. Enabled by default.
     """
 
     BASE_URL = 'https://discordapp.com/api/v6'
@@ -25,20 +52,35 @@ class HTTP:
     LOG_FAILED = 'Request to {bucket} ({url}) failed with status code {code}: {error}. Retrying after {seconds} seconds.'
 
     def __init__(self, token, **kwargs):
-        self._session = kwargs.get('session', requests.Session())
+        max_concurrency = kwargs.get('max_concurrency')
+        self._pool_options = dict(
+            pool_maxsize=kwargs.get('pool_maxsize', max_concurrency or 50),
+            pool_block=kwargs.get('pool_block', False),
+            keep_alive=kwargs.get('keep_alive', True),
+        )
+        self._concurrency = BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+        self._session = kwargs.get('session') or self.create_session()
         self._token = token
-        self.limiter = rate_limit.Limiter()
+        self.limiter = kwargs.get('limiter') or rate_limit.Limiter(preemptive=kwargs.get('preemptive_rate_limits', False))
+        self.retry_policy = kwargs.get('retry_policy') or RetryPolicy(max_retries=self.MAX_RETRIES)
+
+        self.metrics = HTTPMetrics() if kwargs.get('metrics', True) else None
+        self.tracers = []
+        if self.metrics is not None:
+            self.limiter.on_wait = self._rate_limit_waited
+
+        # Identical GET requests that are currently on their way
+        self.coalesce_requests = kwargs.get('coalesce_requests', True)
+        self._in_flight = {}
 
         # Headers stuff
-        self.headers = {
-            'User-Agent': self.create_user_agent(),
-            'Authorization': kwargs.get('application_type', 'Bot') + ' ' + self._token,
-        }
+        self.headers = self.create_headers(kwargs.get('application_type', 'Bot'))
 
     @staticmethod
     def _parse_response(response):
         if response.headers['Content-Type'] == 'application/json':
-            return response.json()
+            return codec.loads(response.content)
         return response.text.encode('utf-8')
 
     def make_request(self, route, fmt=None, **kwargs):
@@ -57,51 +99,145 @@ class HTTP:
         """
 
         fmt = fmt or {}
-        retries = kwargs.pop('retries', 0)
 
+        if self.coalesce_requests and route[0] is Methods.GET:
+            return self._coalesced_request(route, fmt, **kwargs)
+
+        return self._request(route, fmt, **kwargs)
+
+    def _coalesced_request(self, route, fmt, **kwargs):
+        """
+        Merges identical GET requests that are made at the same time into a single one.
+        Every caller gets its own copy of the response, so they can't mess with each other's data.
+        """
+
+        params = kwargs.get('params')
+        key = (route[1].format(**fmt), tuple(sorted(params.items())) if params else None)
+
+        flight = self._in_flight.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            logger.debug('Joining in-flight request to {}.'.format(key[0]))
+            return copy.deepcopy(flight.result.get())
+
+        flight = self._in_flight[key] = _Flight()
+        try:
+            data = self._request(route, fmt, **kwargs)
+        except Exception as error:
+            flight.result.set_exception(error)
+            raise
+        except BaseException:
+            # The owner was killed or timed out. That's none of the waiters' business, but they must not wait forever.
+            flight.result.set_exception(RuntimeError('The request to {} was cancelled.'.format(key[0])))
+            raise
+        else:
+            # The caller is free to modify the data, so the waiters get a snapshot of it.
+            flight.result.set(copy.deepcopy(data) if flight.waiters else data)
+            return data
+        finally:
+            del self._in_flight[key]
+
+    def _request(self, route, fmt, **kwargs):
         # Prepare the headers
         if 'headers' in kwargs:
             kwargs['headers'].update(self.headers)
         else:
             kwargs['headers'] = self.headers
 
-        endpoint = route[1].format(**fmt)
-        method = route[0].value
-        bucket = (method, endpoint)
-        logger.debug('Bucket: {}, Kwargs: {}'.format(bucket, kwargs))
+        state = RequestState(self, route, fmt)
+        bucket = state.bucket
 
-        if not self.limiter.no_global_limit.is_set():
-            self.limiter.no_global_limit.wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Bucket: {}, Kwargs: {}'.format(bucket, kwargs))
 
-        url = (self.BASE_URL + endpoint)
-        response = self._session.request(method, url, **kwargs)
+        while True:
+            state.begin()
+            try:
+                # Streamed bodies have been consumed by the previous attempt.
+                if state.retries and hasattr(kwargs.get('data'), 'rewind'):
+                    kwargs['data'].rewind()
 
-        # Do the rate limit stuff
-        self.limiter(response, bucket)
+                # Only requests to the same bucket have to wait for each other.
+                with self.limiter.reserve(bucket):
+                    state.started()
+                    try:
+                        response = self._send(state.method, state.url, **kwargs)
+                    except requests.RequestException as error:
+                        state.failed(error)
+                        raise
 
-        data = self._parse_response(response)
+                    state.finished(response, int(response.request.headers.get('Content-Length', 0)))
 
-        status = response.status_code
-        if 200 <= status < 300:
-            # Request was successful
-            logger.debug(self.LOG_SUCCESS.format(bucket=bucket, url=url, text=data))
-            return data
+                    # Do the rate limit stuff
+                    self.limiter(response, bucket)
 
-        elif status != 429 and 400 <= status < 500:
-            # This should actually not happen.
-            raise ShitRequestFailedError(response, data, bucket)
+                data = self._parse_response(response)
+                backoff = state.judge(response, data)
+            finally:
+                state.end()
 
-        else:
-            # Some retarded shit happened here. Let's try that again.
-            retries += 1
-            if retries > self.MAX_RETRIES:
-                raise ShitRequestFailedError(response, data, bucket, retries=self.MAX_RETRIES)
-
-            backoff = self.backoff()
-            logger.debug(self.LOG_FAILED.format(bucket=bucket, url=url, code=status, error=response.content, seconds=backoff))
+            if backoff is None:
+                return data
 
             gevent.sleep(backoff)
-            return self.make_request(route, fmt, retries=retries, **kwargs)
+
+    def _rate_limit_waited(self, bucket, seconds, is_global):
+        if self.metrics is not None:
+            self.metrics.record_wait(bucket, seconds, is_global)
+
+        for tracer in self.tracers:
+            tracer.rate_limit_waited(bucket, seconds, is_global)
+
+    def add_tracer(self, tracer):
+        """
+        Registers a `shitcord.http.Tracer` that is notified about every request.
+
+        :param tracer:
+            The tracer to add.
+        """
+
+        self.tracers.append(tracer)
+        self.limiter.on_wait = self._rate_limit_waited
+
+    def remove_tracer(self, tracer):
+        self.tracers.remove(tracer)
+        if not self.tracers and self.metrics is None:
+            self.limiter.on_wait = None
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return None
+
+    def _send(self, method, url, **kwargs):
+        if self._concurrency is None:
+            return self._session.request(method, url, **kwargs)
+
+        with self._concurrency:
+            return self._session.request(method, url, **kwargs)
+
+    def create_session(self):
+        """Creates a `requests.Session` that keeps a pool of connections to the API."""
+
+        session = requests.Session()
+        session.mount('https://', PooledAdapter(**self._pool_options))
+
+        return session
+
+    @property
+    def connection_stats(self):
+        """
+        Statistics about the reuse of pooled connections.
+        New connections to the API require a fresh TLS handshake, reused ones don't.
+        """
+
+        adapter = self._session.get_adapter(self.BASE_URL)
+        if not isinstance(adapter, PooledAdapter):
+            return None
+
+        return adapter.connection_stats()
 
     def close(self):
         self._session.close()
@@ -109,15 +245,26 @@ class HTTP:
 
     def recreate(self, *, session=None):
         if not self._session:
-            self._session = session or requests.Session()
+            self._session = session or self.create_session()
 
-    @staticmethod
-    def backoff():
-        """Generates a random backoff that will be used as the delay before the lib retries to make a request to the Discord API."""
+    def create_headers(self, application_type='Bot'):
+        headers = {
+            'User-Agent': self.create_user_agent(),
+        }
+        if self._token is not None:
+            headers['Authorization'] = application_type + ' ' + self._token
 
-        return randint(100, 50000) / 1000.0
+        return headers
 
     @staticmethod
     def create_user_agent():
         fmt = '{0.__title__} ({0.__url__}, v{0.__version__}) / Python {1[0]}.{1[1]}.{1[2]} / requests {2}'
         return fmt.format(shitcord, sys.version_info, requests.__version__)
+
+
+class _Flight:
+    __slots__ = ('result', 'waiters')
+
+    def __init__(self):
+        self.result = AsyncResult()
+        self.waiters = 0
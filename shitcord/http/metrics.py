@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BOUNDS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class Histogram:
+    """A histogram with fixed bucket bounds that is cheap enough to be updated on every request."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.
+
+    def __repr__(self):
+        return '<Histogram count={0.count} mean={0.mean:.4f}>'.format(self)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+
+        self.count += other.count
+        self.sum += other.sum
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket the given percentile falls into."""
+
+        if not self.count:
+            return 0.
+
+        threshold = self.count * percent / 100.
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            if total >= threshold:
+                return bound
+
+        return self.bounds[-1]
+
+
+class BucketMetrics:
+    """Everything that is counted for a single rate limit bucket."""
+
+    __slots__ = ('latency', 'requests', 'retries', 'rate_limited', 'rate_limit_wait', 'bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0  # Responses with status code 429
+        self.rate_limit_wait = 0.  # Seconds spent waiting for the bucket
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.requests += other.requests
+        self.retries += other.retries
+        self.rate_limited += other.rate_limited
+        self.rate_limit_wait += other.rate_limit_wait
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+    def to_dict(self):
+        return dict(
+            requests=self.requests,
+            retries=self.retries,
+            rate_limited=self.rate_limited,
+            rate_limit_wait=self.rate_limit_wait,
+            bytes_in=self.bytes_in,
+            bytes_out=self.bytes_out,
+            latency_mean=self.latency.mean,
+            latency_p50=self.latency.percentile(50),
+            latency_p99=self.latency.percentile(99),
+        )
+
+
+class HTTPMetrics:
+    """
+    Collects metrics about the requests `shitcord.http.HTTP` makes, per rate limit bucket.
+
+    Bucket keys start with their route, e.g. `GET /channels/{channel}/messages:1234`,
+    so `by_route` can sum up all buckets of a route.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(BucketMetrics)
+        self.global_rate_limit_wait = 0.  # Seconds spent waiting for the global rate limit
+
+    def record_request(self, bucket, latency, status, bytes_out, bytes_in):
+        metrics = self.buckets[bucket]
+        metrics.requests += 1
+        metrics.latency.observe(latency)
+        metrics.bytes_out += bytes_out
+        metrics.bytes_in += bytes_in
+
+        if status == 429:
+            metrics.rate_limited += 1
+
+    def record_retry(self, bucket):
+        self.buckets[bucket].retries += 1
+
+    def record_wait(self, bucket, seconds, is_global=False):
+        if is_global:
+            self.global_rate_limit_wait += seconds
+        else:
+            self.buckets[bucket].rate_limit_wait += seconds
+
+    def by_route(self):
+        """Returns the metrics of all buckets summed up per route."""
+
+        routes = defaultdict(BucketMetrics)
+        for key, metrics in self.buckets.items():
+            routes[key.split(':', 1)[0]].merge(metrics)
+
+        return dict(routes)
+
+    def snapshot(self):
+        """Returns a plain dictionary of everything that was collected, e.g. to export it somewhere."""
+
+        return dict(
+            global_rate_limit_wait=self.global_rate_limit_wait,
+            buckets={key: metrics.to_dict() for key, metrics in self.buckets.items()},
+            routes={key: metrics.to_dict() for key, metrics in self.by_route().items()},
+        )
+
+    def reset(self):
+        self.buckets.clear()
+        self.global_rate_limit_wait = 0.
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import datetime, timedelta
+
+from gevent.pool import Pool
+
+from ..utils.snowflake import Snowflake
+
+logger = logging.getLogger(__name__)
+
+# Discord refuses to bulk delete messages that are older than 14 days.
+# The extra minute makes sure that the clocks of Discord and the bot don't have to agree down to the second.
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=1)
+BULK_DELETE_MIN = 2
+BULK_DELETE_MAX = 100
+
+
+class BulkResult:
+    """
+    The outcome of a bulk operation.
+
+    :ivar succeeded:
+        A list of the IDs the operation succeeded for.
+    :ivar failed:
+        A dictionary mapping the IDs the operation failed for to the exception that was raised.
+    """
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = {}
+
+    def __repr__(self):
+        return '<BulkResult succeeded={} failed={}>'.format(len(self.succeeded), len(self.failed))
+
+    def __bool__(self):
+        return not self.failed
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def bulk_delete_threshold():
+    """Returns the lowest snowflake of a message that can still be bulk deleted."""
+
+    return Snowflake.create_snowflake(datetime.utcnow() - BULK_DELETE_MAX_AGE)
+
+
+class _Purge:
+    """
+    Sorts the messages of a purge into bulk deletions and single deletions.
+    Both backends feed it, so it returns the deletions as `(ids, func, *args)` instead of making them.
+    """
+
+    def __init__(self, api, channel_id):
+        self.api = api
+        self.channel_id = channel_id
+        self.threshold = bulk_delete_threshold()
+        self.young = []
+        self.seen = set()
+
+    def add(self, message_id):
+        """Returns the deletions that can be made right away."""
+
+        # Discord rejects a whole bulk deletion if it contains a message twice, and a message can't be deleted twice anyway.
+        if int(message_id) in self.seen:
+            return []
+        self.seen.add(int(message_id))
+
+        if int(message_id) <= self.threshold:
+            return [([message_id], self.api.delete_message, self.channel_id, message_id)]
+
+        self.young.append(message_id)
+
+        # The history is still being walked, so full chunks are deleted right away.
+        if len(self.young) == BULK_DELETE_MAX:
+            young, self.young = self.young, []
+            return [(young, self.api.bulk_delete_messages, self.channel_id, young)]
+
+        return []
+
+    def finish(self):
+        """Returns the deletions for the messages that are left over."""
+
+        young, self.young = self.young, []
+        if len(young) >= BULK_DELETE_MIN:
+            return [(young, self.api.bulk_delete_messages, self.channel_id, young)]
+        elif young:
+            return [(young, self.api.delete_message, self.channel_id, young[0])]
+
+        return []
+
+
+class _Runner:
+    """Runs single requests concurrently and records their outcome in a `BulkResult`."""
+
+    def __init__(self, concurrency):
+        self.pool = Pool(concurrency)
+        self.result = BulkResult()
+
+    def _run(self, ids, func, *args):
+        try:
+            func(*args)
+        except Exception as error:
+            logger.debug('Bulk operation for {} failed: {}'.format(ids, error))
+            for id in ids:
+                self.result.failed[id] = error
+        else:
+            self.result.succeeded.extend(ids)
+
+    def spawn(self, ids, func, *args):
+        self.pool.spawn(self._run, ids, func, *args)
+
+    def join(self):
+        self.pool.join()
+        return self.result
+
+
+def purge_messages(api, channel_id, messages=None, check=None, limit=None, before=None, after=None, concurrency=5):
+    """
+    Deletes any amount of messages in a channel.
+
+    Messages that are younger than 14 days are deleted in chunks of 100 through the bulk delete endpoint,
+    older ones are deleted one by one with `concurrency` requests at a time. The rate limiter takes care of the buckets.
+
+    :param api:
+        The `shitcord.http.API` to use.
+    :param channel_id:
+        The ID of the channel.
+    :param messages:
+        An iterable of message IDs to delete. If this is `None`, the message history of the channel is searched instead.
+    :param check:
+        A function that takes a message from the history and returns whether it should be deleted.
+    :param limit:
+        The maximum amount of messages to search in the history.
+    :param before:
+        A message ID or datetime to start searching the history before.
+    :param after:
+        A message ID or datetime to stop searching the history at.
+    :param concurrency:
+        How many single deletions may run at the same time.
+
+    :return:
+        A `BulkResult` with the IDs of the deleted messages.
+    """
+
+    if messages is None:
+        history = api.iter_channel_messages(channel_id, before=before or datetime.utcnow(), after=after, limit=limit)
+        messages = (message['id'] for message in history if check is None or check(message))
+
+    purge = _Purge(api, channel_id)
+    runner = _Runner(concurrency)
+
+    for message_id in messages:
+        for deletion in purge.add(message_id):
+            runner.spawn(*deletion)
+
+    for deletion in purge.finish():
+        runner.spawn(*deletion)
+
+    return runner.join()
+
+
+def _bulk_member_roles(func, guild_id, user_ids, role_id, reason, concurrency):
+    runner = _Runner(concurrency)
+
+    for user_id in user_ids:
+        runner.spawn([user_id], func, guild_id, user_id, role_id, reason)
+
+    return runner.join()
+
+
+def add_member_roles(api, guild_id, user_ids, role_id, reason=None, concurrency=5):
+    """Adds a role to any amount of guild members, `concurrency` requests at a time."""
+
+    return _bulk_member_roles(api.add_guild_member_role, guild_id, user_ids, role_id, reason, concurrency)
+
+
+def remove_member_roles(api, guild_id, user_ids, role_id, reason=None, concurrency=5):
+    """Removes a role from any amount of guild members, `concurrency` requests at a time."""
+
+    return _bulk_member_roles(api.remove_guild_member_role, guild_id, user_ids, role_id, reason, concurrency)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+import io
+import mimetypes
+import os
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+
+class File:
+    """
+    Represents a file that is uploaded to Discord.
+
+    The content is never loaded into memory as a whole, it is streamed in chunks while the request is sent.
+
+    :param source:
+        Either a path to a file, a file object opened in binary mode or a buffer like `bytes`, `memoryview` or `mmap.mmap`.
+    :param filename:
+        The name of the file on Discord. Defaults to the name of the path or file object.
+    :param content_type:
+        The MIME type of the file. Guessed from the filename by default.
+    """
+
+    def __init__(self, source, filename=None, content_type=None):
+        self.source = source
+
+        if filename is None:
+            name = source if isinstance(source, str) else getattr(source, 'name', None)
+            filename = os.path.basename(name) if isinstance(name, str) else 'file'
+
+        self.filename = filename
+        self.content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def __repr__(self):
+        return '<shitcord.File filename={0.filename!r} content_type={0.content_type!r}>'.format(self)
+
+    @classmethod
+    def coerce(cls, value):
+        """Turns paths, file objects, buffers and `(filename, source[, content_type])` tuples into a `File`."""
+
+        if isinstance(value, cls):
+            return value
+
+        if isinstance(value, (tuple, list)):
+            filename, source, *rest = value
+            return cls(source, filename, rest[0] if rest else None)
+
+        return cls(value)
+
+    def open(self):
+        """Returns a reader for the content of the file."""
+
+        if isinstance(self.source, str):
+            return _PathReader(self.source)
+
+        # mmap objects can be read like files too, but the buffer protocol doesn't touch their position.
+        try:
+            return _BufferReader(self.source)
+        except TypeError:
+            return _FileReader(self.source)
+
+
+class _BufferReader:
+    """Reads from anything that supports the buffer protocol without copying it as a whole."""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.length = self.view.nbytes
+        self.position = 0
+
+    def read(self, size):
+        chunk = self.view[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk.tobytes()
+
+    def rewind(self):
+        self.position = 0
+
+    def close(self):
+        pass
+
+
+class _FileReader:
+    """Reads from a file object that was opened by the caller, starting at its current position."""
+
+    def __init__(self, file):
+        self.file = file
+        self.start = file.tell()
+
+        try:
+            end = os.fstat(file.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            end = file.seek(0, io.SEEK_END)
+            file.seek(self.start)
+
+        self.length = end - self.start
+
+    def read(self, size):
+        return self.file.read(size)
+
+    def rewind(self):
+        self.file.seek(self.start)
+
+    def close(self):
+        # The file belongs to the caller.
+        pass
+
+
+class _PathReader:
+    """Reads from a path. The file is only kept open while it is read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.length = os.path.getsize(path)
+        self.file = None
+
+    def read(self, size):
+        if self.file is None:
+            self.file = open(self.path, 'rb')
+
+        chunk = self.file.read(size)
+        if not chunk:
+            self.close()
+
+        return chunk
+
+    def rewind(self):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class MultipartStream:
+    """
+    A `multipart/form-data` body that is read in chunks while the request is sent.
+
+    The requests library accepts it as `data` and sends it with a proper `Content-Length`.
+    Before a request is retried, `rewind` has to be called to start over.
+
+    :param fields:
+        A dictionary of form fields, e.g. `payload_json`.
+    :param files:
+        A dictionary mapping field names to `File`s.
+    """
+
+    def __init__(self, fields=None, files=None):
+        self.boundary = uuid.uuid4().hex
+        self._readers = []
+
+        for name, value in (fields or {}).items():
+            headers = 'Content-Disposition: form-data; name="{}"'.format(name)
+            self._add_part(headers, _BufferReader(value.encode('utf-8')))
+
+        for name, file in (files or {}).items():
+            headers = 'Content-Disposition: form-data; name="{}"; filename="{}"\r\nContent-Type: {}'.format(name, file.filename, file.content_type)
+            self._add_part(headers, file.open())
+
+        self._readers.append(_BufferReader('--{}--\r\n'.format(self.boundary).encode('utf-8')))
+
+        self.length = sum(reader.length for reader in self._readers)
+        self._index = 0
+
+    def _add_part(self, headers, reader):
+        self._readers.append(_BufferReader('--{}\r\n{}\r\n\r\n'.format(self.boundary, headers).encode('utf-8')))
+        self._readers.append(reader)
+        self._readers.append(_BufferReader(b'\r\n'))
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=' + self.boundary
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+
+        chunks = []
+        while size > 0 and self._index < len(self._readers):
+            chunk = self._readers[self._index].read(size)
+            if not chunk:
+                self._readers[self._index].close()
+                self._index += 1
+                continue
+
+            chunks.append(chunk)
+            size -= len(chunk)
+
+        return b''.join(chunks)
+
+    def rewind(self):
+        """Starts reading the body from the beginning again."""
+
+        for reader in self._readers:
+            reader.rewind()
+
+        self._index = 0
+
+    def close(self):
+        for reader in self._readers:
+            reader.close()
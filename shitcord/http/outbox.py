@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.queue import Empty, JoinableQueue
+
+logger = logging.getLogger(__name__)
+
+# The maximum length of the content of a message.
+MAX_LENGTH = 2000
+
+
+class _Line:
+    __slots__ = ('content', 'result')
+
+    def __init__(self, content):
+        self.content = content
+        self.result = AsyncResult()
+
+
+class MessageQueue:
+    """
+    Merges messages that are sent to the same channel in quick succession into as few messages as possible.
+
+    Every channel has its own queue. Once a message is queued, the queue waits `window` seconds for more messages
+    and then sends them in order, joined by `separator` and split at the character limit.
+    While a channel is rate limited, the queue keeps collecting messages, so chatty channels need even fewer requests.
+
+    :param api:
+        The `shitcord.http.API` to send the messages with.
+    :param window:
+        The seconds to wait for more messages before sending them.
+    :param separator:
+        The string that is put between merged messages.
+    :param max_length:
+        The maximum length of a merged message.
+    :param idle_timeout:
+        The seconds after which the greenlet of a channel that has nothing to do is stopped.
+    """
+
+    def __init__(self, api, window=.5, separator='\n', max_length=MAX_LENGTH, idle_timeout=60.):
+        self.api = api
+        self.window = window
+        self.separator = separator
+        self.max_length = min(max_length, MAX_LENGTH)
+        self.idle_timeout = idle_timeout
+
+        self._queues = {}
+        self._workers = {}
+
+        self.queued = 0
+        self.sent = 0
+
+    def __repr__(self):
+        return '<shitcord.MessageQueue channels={} queued={}>'.format(len(self._queues), self.queued)
+
+    def send(self, channel_id, content):
+        """
+        Queues a message for a channel.
+
+        :return:
+            A `gevent.event.AsyncResult` that is set to the message that contains the content once it has been sent,
+            or to the exception if sending it failed.
+        """
+
+        if len(content) > self.max_length:
+            raise ValueError('Message content must not be longer than {} characters.'.format(self.max_length))
+
+        line = _Line(content)
+        channel_id = str(channel_id)
+
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = JoinableQueue()
+            self._workers[channel_id] = gevent.spawn(self._work, channel_id, queue)
+
+        self.queued += 1
+        queue.put(line)
+
+        return line.result
+
+    def pack(self, lines):
+        """Splits queued lines into groups that fit into a single message each, keeping their order."""
+
+        group = []
+        length = 0
+        for line in lines:
+            added = len(line.content) + (len(self.separator) if group else 0)
+            if group and length + added > self.max_length:
+                yield group
+                group = []
+                added = len(line.content)
+                length = 0
+
+            group.append(line)
+            length += added
+
+        if group:
+            yield group
+
+    def _work(self, channel_id, queue):
+        while True:
+            try:
+                first = queue.get(timeout=self.idle_timeout)
+            except Empty:
+                # Nothing yields between this and `send`, so no message can end up in a queue without a worker.
+                del self._queues[channel_id]
+                del self._workers[channel_id]
+                return
+
+            gevent.sleep(self.window)
+
+            lines = [first]
+            while queue.qsize():
+                lines.append(queue.get(block=False))
+
+            try:
+                for group in self.pack(lines):
+                    self._deliver(channel_id, group)
+            finally:
+                for _ in lines:
+                    queue.task_done()
+
+    def _deliver(self, channel_id, group):
+        self.queued -= len(group)
+
+        try:
+            message = self.api.create_message(channel_id, self.separator.join(line.content for line in group))
+        except Exception as error:
+            logger.debug('Failed to send {} queued messages to channel {}: {}'.format(len(group), channel_id, error))
+            for line in group:
+                line.result.set_exception(error)
+        else:
+            self.sent += 1
+            for line in group:
+                line.result.set(message)
+
+    def flush(self):
+        """Blocks until every queued message has been sent."""
+
+        for queue in list(self._queues.values()):
+            queue.join()
+
+    def close(self):
+        self.flush()
+        gevent.killall(list(self._workers.values()))
+        self._queues.clear()
+        self._workers.clear()
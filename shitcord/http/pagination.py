@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import datetime
+
+import gevent
+
+from ..utils.snowflake import Snowflake
+
+logger = logging.getLogger(__name__)
+
+
+def to_snowflake(value, high=False):
+    """Converts a datetime into a snowflake that can be used as a pagination cursor. Snowflakes are passed through."""
+
+    if isinstance(value, datetime):
+        return Snowflake.create_snowflake(value, high=high)
+
+    return int(value) if value is not None else None
+
+
+class Paginator:
+    """
+    Iterates over the items of a paginated endpoint.
+
+    While the caller is still busy with the current page, the next one is already fetched in the background.
+
+    :param fetch:
+        A function that takes a cursor and a page size and returns the response of the endpoint.
+    :param next_cursor:
+        A function that takes the last page and returns the cursor of the next one.
+    :param cursor:
+        The cursor to start with.
+    :param limit:
+        The maximum amount of items to yield. `None` for all of them.
+    :param page_size:
+        The maximum amount of items the endpoint returns per request.
+    :param stop:
+        An optional function that takes an item and returns whether the iteration should stop before it.
+    :param prefetch:
+        Whether or not to fetch the next page in the background.
+    :param extract:
+        An optional function that takes the response of the endpoint and returns the list of items in it.
+    """
+
+    def __init__(self, fetch, next_cursor, cursor=None, limit=None, page_size=100, stop=None, prefetch=True, extract=None):
+        self.fetch = fetch
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+        self.limit = limit
+        self.page_size = page_size
+        self.stop = stop
+        self.prefetch = prefetch
+        self.extract = extract
+
+    def _page_size(self, remaining):
+        return self.page_size if remaining is None else min(self.page_size, remaining)
+
+    def _fetch_page(self, cursor, size):
+        response = self.fetch(cursor, size)
+        return self.extract(response) if self.extract else response
+
+    def _request(self, cursor, remaining):
+        size = self._page_size(remaining)
+        if self.prefetch:
+            return size, gevent.spawn(self._fetch_page, cursor, size)
+
+        return size, _Done(self._fetch_page(cursor, size))
+
+    def __iter__(self):
+        remaining = self.limit
+        if remaining is not None and remaining <= 0:
+            return
+
+        size, pending = self._request(self.cursor, remaining)
+
+        try:
+            while pending is not None:
+                page = pending.get()
+                pending = None
+
+                if not page:
+                    return
+
+                # A page that isn't full is the last one.
+                left = None if remaining is None else remaining - len(page)
+                if len(page) >= size and (left is None or left > 0):
+                    size, pending = self._request(self.next_cursor(page), left)
+
+                for item in page:
+                    if self.stop is not None and self.stop(item):
+                        return
+
+                    yield item
+
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+        finally:
+            # The caller stopped early, the page that was fetched in the background isn't needed anymore.
+            if pending is not None:
+                pending.kill(block=False)
+
+
+class _Done:
+    """Mimics an already finished Greenlet."""
+
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def kill(self, block=False):
+        pass
+
+
+def channel_messages(api, channel_id, before=None, after=None, limit=None, prefetch=True, paginator=Paginator):
+    """
+    Iterates over the message history of a channel.
+
+    Without `after`, the messages are yielded from the newest to the oldest one, starting at `before`.
+    With only `after`, the messages are yielded from the oldest to the newest one instead.
+    """
+
+    before = to_snowflake(before)
+    after = to_snowflake(after, high=True)
+
+    if after is not None and before is None:
+        def fetch(cursor, size):
+            return api.get_channel_messages(channel_id, after=cursor, limit=size)
+
+        # Discord sorts every page from the newest to the oldest message.
+        return paginator(fetch, lambda page: page[-1]['id'], after, limit, 100, prefetch=prefetch, extract=lambda page: page[::-1])
+
+    def fetch(cursor, size):
+        return api.get_channel_messages(channel_id, before=cursor, limit=size)
+
+    stop = None
+    if after is not None:
+        stop = lambda message: int(message['id']) <= after
+
+    return paginator(fetch, lambda page: page[-1]['id'], before, limit, 100, stop, prefetch)
+
+
+def guild_members(api, guild_id, after=None, limit=None, prefetch=True, paginator=Paginator):
+    """Iterates over the members of a guild, ordered by their user IDs."""
+
+    def fetch(cursor, size):
+        return api.list_guild_members(guild_id, limit=size, after=cursor)
+
+    return paginator(fetch, lambda page: page[-1]['user']['id'], to_snowflake(after), limit, 1000, prefetch=prefetch)
+
+
+def guild_audit_log(api, guild_id, user_id=None, action_type=None, before=None, after=None, limit=None, prefetch=True, paginator=Paginator):
+    """Iterates over the entries of a guild's audit log from the newest to the oldest one."""
+
+    def fetch(cursor, size):
+        return api.get_guild_audit_log(guild_id, user_id, action_type, cursor, size)
+
+    after = to_snowflake(after, high=True)
+    stop = None
+    if after is not None:
+        stop = lambda entry: int(entry['id']) <= after
+
+    return paginator(fetch, lambda page: page[-1]['id'], to_snowflake(before), limit, 100, stop, prefetch,
+                     extract=lambda response: response['audit_log_entries'])
@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import time
+from contextlib import contextmanager
+
 import gevent
 from gevent.event import Event
+from gevent.lock import Semaphore
 from email.utils import parsedate_to_datetime
 import datetime
 
+from ..utils import codec
+
 logger = logging.getLogger(__name__)
 
+# Discord scopes the rate limits of a route to these parameters.
+# Every other URL parameter shares its bucket with the rest of the route.
+MAJOR_PARAMETERS = ('channel', 'guild', 'webhook')
+
 
 class APIResponse:
     def __init__(self, response, bucket):
@@ -15,14 +25,20 @@ class APIResponse:
         self.bucket = bucket
         self.headers = response.headers
 
-        self.remaining = int(self.headers.get('X-RateLimit-Remaining', 0))
-        self.reset = int(self.headers.get('X-RateLimit-Reset', 0))
+        self.limit = self._header('X-RateLimit-Limit', int)
+        self.remaining = self._header('X-RateLimit-Remaining', int)
+        self.reset = self._header('X-RateLimit-Reset', float)
+        self.reset_after = self._header('X-RateLimit-Reset-After', float)
 
         self.duration = 0.  # This is the actual rate limit duration
 
     def __repr__(self):
         return '<API Response for bucket {} with headers: {}>'.format(self.bucket, self.headers)
 
+    def _header(self, name, cast):
+        value = self.headers.get(name)
+        return cast(value) if value is not None else None
+
     @property
     def is_rate_limited(self):
         return self.remaining == 0
@@ -38,8 +54,11 @@ class APIResponse:
     def get_rate_limit_seconds(self):
         """Returns the total seconds of the rate limit duration."""
 
+        if self.reset_after is not None:
+            return self.reset_after + .5
+
         now = parsedate_to_datetime(self.headers['Date'])
-        reset = datetime.datetime.fromtimestamp(int(self.reset), datetime.timezone.utc)
+        reset = datetime.datetime.fromtimestamp(self.reset, datetime.timezone.utc)
 
         return (reset - now).total_seconds() + .5
 
@@ -51,41 +70,306 @@ class APIResponse:
         return gevent.sleep(delay)
 
 
+class Bucket:
+    """
+    Represents the rate limit state of a single route bucket.
+
+    Requests to different buckets don't know anything about each other and run in parallel.
+    Nobody knows the budget of a bucket that was never used or whose window is over until a response tells,
+    so only a single probe request is let through to such a bucket and the others wait for its response.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.lock = Semaphore()
+
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.reset_at = None  # Monotonic deadline of the current rate limit window
+        self.pending = 0  # Requests that were sent but haven't received a response yet
+
+        self.limited = None  # Whether or not the responses of the bucket have rate limit headers at all
+        self.probing = False  # Whether or not a request is out to learn the state of the bucket
+        self.settled = Event()  # Set while no probe is out
+        self.settled.set()
+
+    def __repr__(self):
+        return '<Bucket {0.key} limit={0.limit} remaining={0.remaining} reset={0.reset}>'.format(self)
+
+    def update(self, response):
+        """Takes over the rate limit information from an `APIResponse` if it has any."""
+
+        if response.remaining is None:
+            return
+
+        # Late responses of a window that is already over don't know anything about the current one.
+        if self.reset is not None and response.reset is not None:
+            if response.reset < self.reset or (response.reset == self.reset and self.remaining is None):
+                return
+
+        # The headers don't know about requests that are still on their way,
+        # so these are subtracted from the remaining budget the API tells us about.
+        remaining = max(0, response.remaining - (self.pending - 1))
+
+        if self.remaining is not None and response.reset == self.reset:
+            remaining = min(self.remaining, remaining)
+
+        self.limited = True
+        self.limit = response.limit
+        self.remaining = remaining
+        self.reset = response.reset
+        self.reset_at = time.monotonic() + response.get_rate_limit_seconds()
+
+    def exhaust(self, duration):
+        """Marks the bucket as empty for the next `duration` seconds."""
+
+        self.remaining = 0
+        self.reset_at = time.monotonic() + duration
+
+    def take(self, now):
+        """
+        Takes one request from the budget of the bucket if it has some left. Never blocks.
+
+        :return:
+            `0` if the request may be sent, the seconds until the bucket resets if it is exhausted,
+            or `None` if the request has to wait for the response of the probe.
+        """
+
+        if self.reset_at is not None and self.reset_at <= now:
+            # The window is over, but how many requests the next one allows is only known once one of them was answered.
+            self.remaining = None
+            self.reset_at = None
+
+        if self.remaining is None:
+            if self.limited is False:
+                return 0.
+
+            if self.probing:
+                return None
+
+            self.probing = True
+            self.settled.clear()
+            return 0.
+
+        if self.remaining <= 0:
+            return self.reset_at - now
+
+        self.remaining -= 1
+        return 0.
+
+    def settle(self):
+        """Called once the probe was answered or failed, which lets the requests through that waited for it."""
+
+        if not self.probing:
+            return
+
+        # A bucket whose probe didn't come back with rate limit headers doesn't seem to have a rate limit.
+        if self.remaining is None and self.limited is None:
+            self.limited = False
+
+        self.probing = False
+        self.settled.set()
+
+    def idle(self, now):
+        """Whether or not the bucket can be forgotten without losing anything."""
+
+        return (not self.pending and not self.probing and not self.lock.locked()
+                and (self.reset_at is None or self.reset_at <= now))
+
+    def acquire(self):
+        """
+        Takes one request from the budget of the bucket.
+
+        If the budget is used up, this blocks until the bucket resets instead
+        of sending a request that is known to end up with a 429.
+
+        :return:
+            A tuple of the seconds the request was held because of the rate limit
+            and whether or not it is the probe of the bucket, which has to call `Bucket.settle` once it's done.
+        """
+
+        slept = 0.
+        with self.lock:
+            while True:
+                was_probing = self.probing
+                delay = self.take(time.monotonic())
+                if delay is None:
+                    self.settled.wait()
+                elif delay > 0:
+                    logger.debug('Bucket {} is exhausted, holding the request for {} seconds.'.format(self.key, delay))
+                    gevent.sleep(delay)
+                    slept += delay
+                else:
+                    return slept, self.probing and not was_probing
+
+
 class Limiter:
-    def __init__(self):
+    """
+    Keeps track of the rate limits of all buckets.
+
+    :param preemptive:
+        Whether or not to hold requests locally until their bucket has budget left.
+        By default, the limiter only sleeps after a response indicates that a bucket is exhausted.
+    """
+
+    bucket_class = Bucket
+
+    # How many buckets are kept before the ones nobody uses anymore are forgotten.
+    PRUNE_THRESHOLD = 1000
+
+    def __init__(self, preemptive=False):
+        self.preemptive = preemptive
         self.is_global = False
 
+        # Called with the bucket key, the seconds and whether it was the global rate limit whenever a request had to wait.
+        self.on_wait = None
+
         self.no_global_limit = Event()
         self.no_global_limit.set()
 
+        self.buckets = {}
+        self._prune_at = self.PRUNE_THRESHOLD
+
     def __call__(self, response, bucket):
-        self.response = APIResponse(response, bucket)
+        response = APIResponse(response, bucket.key)
+        bucket.update(response)
+
+        if self.preemptive:
+            return self.schedule(response, bucket)
+
+        return self.cooldown(response)
+
+    @contextmanager
+    def reserve(self, bucket):
+        """
+        A Context Manager that has to wrap every request to a bucket.
 
-        return self.cooldown()
+        In preemptive mode, this waits until the bucket has budget and lets concurrent requests to the bucket through,
+        otherwise requests to the same bucket are sent one after another.
+        """
+
+        # Only the time that is actually slept because of a rate limit is reported. Waiting for the lock of a bucket
+        # is just queueing behind other requests, and the cooldowns they sleep through are reported by themselves.
+        if self.preemptive:
+            slept, probe = bucket.acquire()
+            self._waited(bucket.key, slept)
+
+            try:
+                self.wait_global(bucket.key)
+                bucket.pending += 1
+
+                try:
+                    yield
+                finally:
+                    bucket.pending -= 1
+            finally:
+                if probe:
+                    bucket.settle()
+        else:
+            with bucket.lock:
+                self.wait_global(bucket.key)
+                bucket.pending += 1
+
+                try:
+                    yield
+                finally:
+                    bucket.pending -= 1
+
+    def _waited(self, bucket, seconds, is_global=False):
+        if self.on_wait is not None and seconds > 0:
+            self.on_wait(bucket, seconds, is_global)
+
+    def wait_global(self, bucket=None):
+        if not self.no_global_limit.is_set():
+            started = time.monotonic()
+            self.no_global_limit.wait()
+            self._waited(bucket, time.monotonic() - started, True)
+
+    def release_global(self):
+        self.is_global = False
+        self.no_global_limit.set()
 
-    def cooldown(self):
+    @staticmethod
+    def get_bucket_key(route, fmt):
+        """
+        Computes the key of the bucket a request belongs to.
+
+        :param route:
+            The route of the request, see `shitcord.http.Endpoints`.
+        :param fmt:
+            The dictionary that is used to format the route's URL.
+
+        :return:
+            A string that identifies the bucket, e.g. `GET /channels/{channel}/messages:1234`.
+        """
+
+        method, path = route
+        major = [str(fmt[param]) for param in MAJOR_PARAMETERS if '{' + param + '}' in path and param in fmt]
+
+        return '{} {}:{}'.format(method.value, path, ':'.join(major))
+
+    def get_bucket(self, route, fmt):
+        """Returns the `Bucket` for a request and creates it if it doesn't exist yet."""
+
+        key = self.get_bucket_key(route, fmt)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self._prune_at:
+                self.prune()
+
+            bucket = self.buckets[key] = self.bucket_class(key)
+
+        return bucket
+
+    def prune(self):
+        """
+        Forgets the buckets whose rate limit window is over and that no request is using.
+        A bot sees a new bucket for every channel and guild it talks to, so they would pile up otherwise.
+        """
+
+        now = time.monotonic()
+        for key in [key for key, bucket in self.buckets.items() if bucket.idle(now)]:
+            del self.buckets[key]
+
+        # If most buckets are busy, there's no point in looking at them again for every new one.
+        self._prune_at = max(self.PRUNE_THRESHOLD, 2 * len(self.buckets))
+
+    def cooldown(self, response):
         """This actually cools down a route."""
 
-        self.check_rate_limit()
+        self.check_rate_limit(response)
+
+        if response.is_rate_limited and response.rate_limit_duration > 0:
+            response.sleep()
+            self._waited(response.bucket, response.rate_limit_duration, self.is_global)
+
+            if self.is_global:
+                self.release_global()
+
+    def schedule(self, response, bucket):
+        """Used instead of `cooldown` in preemptive mode. The next request to the bucket waits instead of this one."""
+
+        self.check_rate_limit(response)
 
-        if self.response.is_rate_limited and self.response.rate_limit_duration > 0:
-            gevent.spawn(self.response.sleep).get()
+        if response.status_code == 429:
+            bucket.exhaust(response.rate_limit_duration)
 
             if self.is_global:
-                self.is_global = False
-                self.no_global_limit.set()
+                gevent.spawn_later(response.rate_limit_duration, self.release_global)
 
-    def check_rate_limit(self):
+    def check_rate_limit(self, response):
         """Checks the HTTP status code to indicate the current rate limit status."""
 
-        if self.response.is_rate_limited and self.response.status_code != 429:
-            duration = self.response.get_rate_limit_seconds()
+        if response.is_rate_limited and response.status_code != 429:
+            duration = response.get_rate_limit_seconds()
 
-            logger.debug('Rate limit for {}, seconds: {}'.format(self.response, duration))
-            self.response.duration = duration
+            logger.debug('Rate limit for {}, seconds: {}'.format(response, duration))
+            response.duration = duration
 
-        elif self.response.status_code == 429:
-            resp = self.response.response.json()
+        elif response.status_code == 429:
+            resp = codec.loads(response.response.content)
 
             retry_after = resp['retry_after'] / 1000.0
             logger.debug('You are being rate limited. We will retry it in {} seconds.'.format(retry_after))
@@ -95,4 +379,6 @@ class Limiter:
                 self.no_global_limit.clear()
                 logger.debug('Dude, it\'s even a global rate limit! Let\'s sleep until that shit is done.')
 
-            self.response.duration = retry_after
+            # Make sure that we actually sleep, no matter what the headers say.
+            response.remaining = 0
+            response.duration = retry_after
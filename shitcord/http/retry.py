@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Keeps track of the server errors of a single bucket.
+
+    After `threshold` server errors in a row, the circuit opens and requests to the bucket fail fast for `timeout` seconds.
+    Afterwards, a single request is let through to probe whether Discord has recovered.
+    """
+
+    def __init__(self, threshold=5, timeout=30.0):
+        self.threshold = threshold
+        self.timeout = timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._probe_started = None
+
+    def __repr__(self):
+        return '<CircuitBreaker failures={0.failures} open={0.is_open}>'.format(self)
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    @property
+    def idle(self):
+        """Whether or not the breaker is closed and has no failures to remember, so it's as good as a new one."""
+
+        return self.opened_at is None and not self.failures and not self._probing
+
+    @property
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0.
+
+        return max(0., self.opened_at + self.timeout - time.monotonic())
+
+    def allow(self):
+        """Returns whether a request to the bucket may be made right now."""
+
+        if self.opened_at is None:
+            return True
+
+        if self.retry_in > 0:
+            return False
+
+        # A probe that never came back must not keep the circuit closed to everyone else forever.
+        if self._probing and time.monotonic() - self._probe_started < self.timeout:
+            return False
+
+        self._probing = True
+        self._probe_started = time.monotonic()
+        return True
+
+    def release(self):
+        """Lets another request probe the bucket, because the current probe ended without a response."""
+
+        self._probing = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+
+        if self._probing or self.failures >= self.threshold:
+            logger.debug('Opening circuit after {} server errors in a row.'.format(self.failures))
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests that are made, so retries can't turn into a storm.
+
+    Every request deposits `ratio` tokens, every retry withdraws a whole one.
+    On top of that, `min_per_second` retries are always allowed so a quiet client can still retry.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_balance=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+
+        self.balance = max_balance
+        self._last_refill = time.monotonic()
+
+    def _refill(self, amount):
+        self.balance = min(self.max_balance, self.balance + amount)
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self):
+        now = time.monotonic()
+        self._refill((now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+        if self.balance < 1:
+            return False
+
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried.
+
+    :param max_retries:
+        The maximum amount of retries for a single request.
+    :param base:
+        The base delay of the exponential backoff in seconds.
+    :param cap:
+        The maximum delay between two attempts in seconds.
+    :param budget:
+        A `RetryBudget` that is shared by all requests. Pass `False` to allow any amount of retries.
+    :param breaker_threshold:
+        How many server errors in a row open the circuit of a bucket.
+    :param breaker_timeout:
+        How many seconds an open circuit fails fast before it lets a request through again.
+    """
+
+    # How many breakers are kept before the idle ones are forgotten.
+    PRUNE_THRESHOLD = 1000
+
+    def __init__(self, max_retries=5, base=0.5, cap=10.0, budget=None, breaker_threshold=5, breaker_timeout=30.0):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.budget = RetryBudget() if budget is None else budget or None
+
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.breakers = {}
+        self._prune_at = self.PRUNE_THRESHOLD
+
+    def breaker(self, bucket):
+        """Returns the `CircuitBreaker` of a bucket key."""
+
+        breaker = self.breakers.get(bucket)
+        if breaker is None:
+            if len(self.breakers) >= self._prune_at:
+                self.prune()
+
+            breaker = self.breakers[bucket] = CircuitBreaker(self.breaker_threshold, self.breaker_timeout)
+
+        return breaker
+
+    def prune(self):
+        """Forgets the breakers that are closed and have no failures, there's one for every bucket otherwise."""
+
+        for bucket in [bucket for bucket, breaker in self.breakers.items() if breaker.idle]:
+            del self.breakers[bucket]
+
+        self._prune_at = max(self.PRUNE_THRESHOLD, 2 * len(self.breakers))
+
+    def record_request(self):
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def should_retry(self, retries, status):
+        """
+        Returns whether the `retries`-th retry of a request may be made.
+
+        Rate limited requests don't draw from the retry budget, the rate limiter already decides how long they wait.
+        """
+
+        if retries > self.max_retries:
+            return False
+
+        if status == 429 or self.budget is None:
+            return True
+
+        return self.budget.withdraw()
+
+    def backoff(self, retries, retry_after=None):
+        """
+        Computes the delay before the next attempt.
+
+        :param retries:
+            The number of the upcoming retry, starting at 1.
+        :param retry_after:
+            The amount of seconds the API asked us to wait, if it did so. This takes precedence over the backoff.
+
+        :return:
+            The delay in seconds.
+        """
+
+        if retry_after is not None:
+            return min(self.cap, retry_after)
+
+        # Capped exponential backoff with full jitter
+        return random.uniform(0, min(self.cap, self.base * 2 ** (retries - 1)))
@@ -21,14 +21,14 @@ class Endpoints:
     GET_GUILD_CHANNELS                = (Methods.GET, GUILD + '/{guild}/channels')
     CREATE_GUILD_CHANNEL              = (Methods.POST, GUILD + '/{guild}/channels')
     MODIFY_GUILD_CHANNEL_POSITIONS    = (Methods.PATCH, '/{guild}/channels')
-    GET_GUILD_MEMBER                  = (Methods.GET, GUILD + '/{guild}/members/{member}')
+    GET_GUILD_MEMBER                  = (Methods.GET, GUILD + '/{guild}/members/{user}')
     LIST_GUILD_MEMBERS                = (Methods.GET, GUILD + '/{guild}/members')
-    ADD_GUILD_MEMBER                  = (Methods.PUT, GUILD + '/{guild}/members/{member}')
-    MODIFY_GUILD_MEMBER               = (Methods.PATCH, GUILD + '/{guild}/members/{member}')
+    ADD_GUILD_MEMBER                  = (Methods.PUT, GUILD + '/{guild}/members/{user}')
+    MODIFY_GUILD_MEMBER               = (Methods.PATCH, GUILD + '/{guild}/members/{user}')
     MODIFY_CURRENT_USER_NICK          = (Methods.PATCH, GUILD + '/{guild}/members/@me/nick')
-    ADD_GUILD_MEMBER_ROLE             = (Methods.PUT, GUILD + '/{guild}/members/{member}/roles/{role}')
-    REMOVE_GUILD_MEMBER_ROLE          = (Methods.DELETE, GUILD + '/{guild}/members/{member}/roles/{role}')
-    REMOVE_GUILD_MEMBER               = (Methods.DELETE, GUILD + '/{guild}/members/{member}')
+    ADD_GUILD_MEMBER_ROLE             = (Methods.PUT, GUILD + '/{guild}/members/{user}/roles/{role}')
+    REMOVE_GUILD_MEMBER_ROLE          = (Methods.DELETE, GUILD + '/{guild}/members/{user}/roles/{role}')
+    REMOVE_GUILD_MEMBER               = (Methods.DELETE, GUILD + '/{guild}/members/{user}')
     GET_GUILD_BANS                    = (Methods.GET, GUILD + '/{guild}/bans')
     GET_GUILD_BAN                     = (Methods.GET, GUILD + '/{guild}/bans/{user}')
     CREATE_GUILD_BAN                  = (Methods.PUT, GUILD + '/{guild}/bans/{user}')
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from itertools import count
+
+import gevent
+from gevent.lock import Semaphore
+from gevent.server import StreamServer
+
+from ..utils import codec
+from .rate_limit import APIResponse, Bucket, Limiter
+
+logger = logging.getLogger(__name__)
+
+
+class _Reported:
+    """The rate limit information of a response that was reported by another process, as `Bucket.update` wants it."""
+
+    __slots__ = ('limit', 'remaining', 'reset', 'reset_after')
+
+    def __init__(self, limit, remaining, reset, reset_after):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.reset_after = reset_after
+
+    def get_rate_limit_seconds(self):
+        return self.reset_after
+
+
+class RateLimitCoordinator:
+    """
+    Keeps the rate limit state of several processes that share a bot token on a Unix socket.
+
+    Every process talks to it through a `SharedLimiter`, so the budgets of the buckets and the global rate limit
+    are shared instead of every process burning through them on its own.
+    Run it in a process that outlives the workers, e.g. the one that starts them.
+
+    :param path:
+        The path of the Unix socket.
+    """
+
+    # How long a process waits before it asks again while another one probes a bucket whose state is unknown.
+    PROBE_INTERVAL = .05
+
+    def __init__(self, path):
+        self.path = path
+        self.server = None
+
+        self.buckets = {}
+        self.global_until = 0.
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket(key)
+
+        return bucket
+
+    def start(self):
+        """Starts to serve in the background."""
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(128)
+
+        self.server = StreamServer(listener, self.handle)
+        self.server.start()
+        logger.debug('Rate limit coordinator is listening on {}.'.format(self.path))
+
+    def serve_forever(self):
+        if self.server is None:
+            self.start()
+
+        self.server.serve_forever()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def handle(self, connection, address):
+        # The requests of this connection that were let through, by the ID the process gave them.
+        # Requests of a process that died without a response don't count as pending anymore.
+        reservations = {}
+        reader = connection.makefile('rb')
+
+        try:
+            for line in reader:
+                message = codec.loads(line)
+                reply = self.dispatch(message, reservations)
+                if reply is not None:
+                    connection.sendall((codec.dumps(reply) + '\n').encode('utf-8'))
+        except (OSError, ValueError) as error:
+            logger.debug('Lost a rate limit client: {}'.format(error))
+        finally:
+            for request_id in list(reservations):
+                self.release(reservations, request_id)
+
+            reader.close()
+            connection.close()
+
+    def dispatch(self, message, reservations):
+        op = message['op']
+        bucket = self._bucket(message['key'])
+
+        if op == 'acquire':
+            probing = bucket.probing
+            delay = self.acquire(bucket)
+            if delay <= 0:
+                reservations[message['id']] = (bucket, bucket.probing and not probing)
+
+            return dict(delay=delay)
+
+        elif op == 'update':
+            bucket.update(_Reported(message['limit'], message['remaining'], message['reset'], message['reset_after']))
+
+        elif op == 'exhaust':
+            bucket.exhaust(message['duration'])
+            if message['global']:
+                self.global_until = max(self.global_until, time.monotonic() + message['duration'])
+
+        elif op == 'release':
+            self.release(reservations, message['id'])
+
+        return None
+
+    @staticmethod
+    def release(reservations, request_id):
+        # A process that reconnected releases the requests of its old connection, which were released when it dropped.
+        reservation = reservations.pop(request_id, None)
+        if reservation is None:
+            return
+
+        bucket, probe = reservation
+        bucket.pending -= 1
+        if probe:
+            bucket.settle()
+
+    def acquire(self, bucket):
+        """
+        Takes one request from the budget of a bucket.
+
+        :return:
+            `0` if the request may be sent, otherwise the seconds to wait before asking again.
+        """
+
+        now = time.monotonic()
+        if self.global_until > now:
+            return self.global_until - now
+
+        delay = bucket.take(now)
+        if delay is None:
+            return self.PROBE_INTERVAL
+        if delay > 0:
+            return delay
+
+        bucket.pending += 1
+        return 0.
+
+
+class _Connection:
+    """A connection to a `RateLimitCoordinator` that is shared by all greenlets of a process."""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self.lock = Semaphore()
+
+        self._socket = None
+        self._reader = None
+
+    def _connect(self):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self.timeout)
+            self._socket.connect(self.path)
+            self._reader = self._socket.makefile('rb')
+
+    def close(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = self._reader = None
+
+    def send(self, message, reply=False):
+        with self.lock:
+            try:
+                self._connect()
+                self._socket.sendall((codec.dumps(message) + '\n').encode('utf-8'))
+
+                if reply:
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionResetError('The rate limit coordinator closed the connection.')
+
+                    return codec.loads(line)
+            except OSError:
+                self.close()
+                raise
+
+
+class SharedLimiter(Limiter):
+    """
+    A `shitcord.http.Limiter` that shares its state with the `SharedLimiter`s of other processes
+    through a `RateLimitCoordinator`. Pass it to `HTTP` as `limiter`.
+
+    Requests are always held until their bucket has budget left, like in preemptive mode.
+    If the coordinator can't be reached, the limiter falls back to the rate limits this process knows about.
+
+    :param path:
+        The path of the coordinator's Unix socket.
+    :param timeout:
+        The seconds to wait for the coordinator before falling back.
+    """
+
+    def __init__(self, path, timeout=1.):
+        super().__init__(preemptive=True)
+
+        self.connection = _Connection(path, timeout)
+        self._request_ids = count()
+
+    def _notify(self, **message):
+        try:
+            self.connection.send(message)
+        except OSError as error:
+            logger.debug('Failed to report to the rate limit coordinator: {}'.format(error))
+
+    def _acquire(self, key, request_id):
+        slept = 0.
+        while True:
+            delay = self.connection.send(dict(op='acquire', key=key, id=request_id), reply=True)['delay']
+            if delay <= 0:
+                return slept
+
+            logger.debug('Bucket {} is exhausted across processes, holding the request for {} seconds.'.format(key, delay))
+            gevent.sleep(delay)
+            slept += delay
+
+    @contextmanager
+    def reserve(self, bucket):
+        request_id = next(self._request_ids)
+        try:
+            slept = self._acquire(bucket.key, request_id)
+        except OSError as error:
+            logger.warning('The rate limit coordinator is unreachable, only local rate limits apply: {}'.format(error))
+            with super().reserve(bucket):
+                yield
+            return
+
+        self._waited(bucket.key, slept)
+        self.wait_global(bucket.key)
+        bucket.pending += 1
+
+        try:
+            yield
+        finally:
+            bucket.pending -= 1
+            self._notify(op='release', key=bucket.key, id=request_id)
+
+    def __call__(self, response, bucket):
+        response = APIResponse(response, bucket.key)
+        bucket.update(response)
+
+        if response.remaining is not None:
+            self._notify(op='update', key=bucket.key, limit=response.limit, remaining=response.remaining,
+                         reset=response.reset, reset_after=response.get_rate_limit_seconds())
+
+        self.schedule(response, bucket)
+
+        if response.status_code == 429:
+            self._notify(op='exhaust', key=bucket.key, duration=response.rate_limit_duration, **{'global': self.is_global})
+
+    def close(self):
+        self.connection.close()
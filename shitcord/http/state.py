@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from .errors import CircuitOpenError, ShitRequestFailedError
+
+logger = logging.getLogger(__name__)
+
+
+class RequestState:
+    """
+    Everything about a request that doesn't depend on how it is sent: The circuit breaker, retries, backoff, metrics and tracers.
+
+    `shitcord.http.HTTP` and `shitcord.aio.AsyncHTTP` only do the I/O and ask this what to do about it.
+    An attempt looks like this:
+
+        state.begin()
+        try:
+            state.started()
+            response = send(...)  # state.failed(error) if this raises
+            state.finished(response, request_size)
+            data = parse(response)
+            delay = state.judge(response, data)
+        finally:
+            state.end()
+
+    If `judge` returns `None`, the request is done. Otherwise it has to be retried after `delay` seconds.
+
+    :param http:
+        The `shitcord.http.HTTP` or `shitcord.aio.AsyncHTTP` that makes the request.
+    :param route:
+        The route of the request.
+    :param fmt:
+        The dictionary that is used to format the route's URL.
+    """
+
+    __slots__ = ('http', 'method', 'url', 'bucket', 'breaker', 'retries', 'probing', '_started', '_debug')
+
+    def __init__(self, http, route, fmt):
+        self.http = http
+        self.method = route[0].value
+        self.url = http.BASE_URL + route[1].format(**fmt)
+        self.bucket = http.limiter.get_bucket(route, fmt)
+        self.breaker = http.retry_policy.breaker(self.bucket.key)
+
+        self.retries = 0
+        self.probing = False
+        self._started = None
+
+        # Building the log messages is expensive, so don't do it for nothing.
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+
+        http.retry_policy.record_request()
+
+    def __repr__(self):
+        return '<RequestState {0.method} {0.url} retries={0.retries}>'.format(self)
+
+    def begin(self):
+        """Called before every attempt. Raises `CircuitOpenError` if the bucket keeps failing."""
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.bucket.key, self.breaker.retry_in)
+
+        # A request that is let through an open circuit probes whether Discord has recovered.
+        self.probing = self.breaker.is_open
+
+    def end(self):
+        """Called after every attempt, no matter how it ended."""
+
+        # The probe may have ended without a verdict, e.g. because the body was garbage or the request was cancelled.
+        if self.probing:
+            self.breaker.release()
+            self.probing = False
+
+    def started(self):
+        """Called right before the request is sent, once the rate limiter let it through."""
+
+        for tracer in self.http.tracers:
+            tracer.request_started(self.method, self.url, self.bucket.key)
+
+        self._started = time.monotonic()
+
+    def failed(self, error):
+        """Called if the request couldn't be sent at all, e.g. because of connection errors."""
+
+        self.breaker.failure()
+        for tracer in self.http.tracers:
+            tracer.request_failed(self.method, self.url, self.bucket.key, error)
+
+    def finished(self, response, request_size):
+        """Called once the response has arrived."""
+
+        latency = time.monotonic() - self._started
+        if self.http.metrics is not None:
+            self.http.metrics.record_request(self.bucket.key, latency, response.status_code, request_size, len(response.content))
+
+        for tracer in self.http.tracers:
+            tracer.request_finished(self.method, self.url, self.bucket.key, response, latency)
+
+    def judge(self, response, data):
+        """
+        Decides what happens with a response.
+
+        :return:
+            `None` if the request succeeded, otherwise the seconds to wait before it is retried.
+        """
+
+        status = response.status_code
+        if status < 500:
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+        if 200 <= status < 300:
+            # Request was successful
+            if self._debug:
+                logger.debug(self.http.LOG_SUCCESS.format(bucket=self.bucket.key, url=self.url, text=data))
+            return None
+
+        elif status != 429 and 400 <= status < 500:
+            # This should actually not happen.
+            raise ShitRequestFailedError(response, data, self.bucket.key)
+
+        # Some retarded shit happened here. Let's try that again.
+        self.retries += 1
+        policy = self.http.retry_policy
+        if not policy.should_retry(self.retries, status):
+            raise ShitRequestFailedError(response, data, self.bucket.key, retries=self.retries - 1)
+
+        # The rate limiter has already waited for 429s.
+        backoff = 0. if status == 429 else policy.backoff(self.retries, self.http._retry_after(response))
+        if self._debug:
+            logger.debug(self.http.LOG_FAILED.format(bucket=self.bucket.key, url=self.url, code=status, error=response.content, seconds=backoff))
+
+        if self.http.metrics is not None:
+            self.http.metrics.record_retry(self.bucket.key)
+
+        for tracer in self.http.tracers:
+            tracer.retrying(self.method, self.url, self.bucket.key, self.retries, backoff)
+
+        return backoff
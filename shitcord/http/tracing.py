@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+
+class Tracer:
+    """
+    Base class for tracers that want to follow the requests `shitcord.http.HTTP` makes.
+
+    Register one with `HTTP.add_tracer` and override the hooks you are interested in.
+    As long as no tracer is registered, the hooks aren't even called.
+    """
+
+    def request_started(self, method, url, bucket):
+        """Called before a request is sent, once per attempt."""
+
+    def request_finished(self, method, url, bucket, response, latency):
+        """Called after a response was received, once per attempt."""
+
+    def request_failed(self, method, url, bucket, error):
+        """Called if a request couldn't be made at all, e.g. because of connection errors."""
+
+    def rate_limit_waited(self, bucket, seconds, is_global):
+        """Called after a request had to wait for a rate limit."""
+
+    def retrying(self, method, url, bucket, retries, delay):
+        """Called before a failed request is retried after `delay` seconds."""
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.queue import Empty, JoinableQueue
+
+from .http import HTTP
+from .routes import Endpoints
+
+logger = logging.getLogger(__name__)
+
+# Discord doesn't take more embeds than that in a single message.
+MAX_EMBEDS = 10
+
+
+class _Job:
+    __slots__ = ('payload', 'result')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.result = AsyncResult()
+
+    @property
+    def embeds_only(self):
+        return 'embeds' in self.payload and 'content' not in self.payload and not self.payload.get('tts')
+
+    def merges_with(self, other):
+        return (other.embeds_only
+                and other.payload.get('username') == self.payload.get('username')
+                and other.payload.get('avatar_url') == self.payload.get('avatar_url'))
+
+
+class WebhookExecutor:
+    """
+    Executes webhooks without a bot token, e.g. to push lots of alerts to lots of webhooks.
+
+    Every webhook has its own queue that is worked off by its own greenlet, one message after another,
+    so a webhook that is rate limited doesn't hold up the others.
+    Queued messages to the same webhook that only consist of embeds are merged into a single message.
+
+    :param http:
+        The `shitcord.http.HTTP` to use. By default, one without a token is created from `kwargs`.
+    :param max_embeds:
+        The maximum amount of embeds to merge into a single message.
+    :param queue_size:
+        The maximum amount of messages that may be queued per webhook. `execute` blocks while a queue is full.
+        Unbounded by default.
+    :param idle_timeout:
+        The seconds after which the greenlet of a webhook that has nothing to do is stopped.
+    :param kwargs:
+        Arguments that will be passed along to `shitcord.http.HTTP`, e.g. `pool_maxsize` or `max_concurrency`.
+    """
+
+    def __init__(self, http=None, max_embeds=MAX_EMBEDS, queue_size=None, idle_timeout=60., **kwargs):
+        self.http = http or HTTP(None, **kwargs)
+        self.max_embeds = min(max_embeds, MAX_EMBEDS)
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+
+        self._queues = {}
+        self._workers = {}
+
+        self.queued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.merged = 0
+
+    def __repr__(self):
+        return '<shitcord.WebhookExecutor webhooks={} queued={}>'.format(len(self._queues), self.queued)
+
+    @property
+    def stats(self):
+        """Returns how many messages were queued, delivered, failed and merged into other messages."""
+
+        return dict(queued=self.queued, delivered=self.delivered, failed=self.failed, merged=self.merged)
+
+    def execute(self, webhook_id, webhook_token, content=None, username=None, avatar_url=None, tts=None, embeds=None):
+        """
+        Queues a message for a webhook.
+
+        :return:
+            A `gevent.event.AsyncResult` that is set to the message once it has been delivered,
+            or to the exception if delivering it failed.
+        """
+
+        payload = {key: value for key, value in dict(
+            content=content,
+            username=username,
+            avatar_url=avatar_url,
+            tts=tts,
+            embeds=embeds,
+        ).items() if value is not None}
+
+        job = _Job(payload)
+        key = (str(webhook_id), webhook_token)
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = JoinableQueue(self.queue_size)
+            self._workers[key] = gevent.spawn(self._work, key, queue)
+
+        self.queued += 1
+        queue.put(job)
+
+        return job.result
+
+    def _work(self, key, queue):
+        while True:
+            try:
+                job = queue.get(timeout=self.idle_timeout)
+            except Empty:
+                # Nothing yields between this and `execute`, so no message can end up in a queue without a worker.
+                del self._queues[key]
+                del self._workers[key]
+                return
+
+            jobs = [job]
+            if job.embeds_only:
+                embeds = len(job.payload['embeds'])
+
+                while queue.qsize():
+                    following = queue.peek(block=False)
+                    if not job.merges_with(following) or embeds + len(following.payload['embeds']) > self.max_embeds:
+                        break
+
+                    jobs.append(queue.get(block=False))
+                    embeds += len(following.payload['embeds'])
+
+            try:
+                self._deliver(key, jobs)
+            finally:
+                for _ in jobs:
+                    queue.task_done()
+
+    def _deliver(self, key, jobs):
+        webhook_id, webhook_token = key
+
+        payload = jobs[0].payload
+        if len(jobs) > 1:
+            payload = dict(payload, embeds=[embed for job in jobs for embed in job.payload['embeds']])
+            self.merged += len(jobs) - 1
+
+        self.queued -= len(jobs)
+
+        try:
+            message = self.http.make_request(Endpoints.EXECUTE_WEBHOOK, dict(webhook=webhook_id, token=webhook_token),
+                                             params={'wait': 1}, json=payload)
+        except Exception as error:
+            logger.debug('Failed to execute webhook {}: {}'.format(webhook_id, error))
+            self.failed += len(jobs)
+            for job in jobs:
+                job.result.set_exception(error)
+        else:
+            self.delivered += len(jobs)
+            for job in jobs:
+                job.result.set(message)
+
+    def join(self):
+        """Blocks until every queued message has been delivered or has failed."""
+
+        for queue in list(self._queues.values()):
+            queue.join()
+
+    def close(self):
+        """Delivers the queued messages and closes the pooled connections."""
+
+        self.join()
+        gevent.killall(list(self._workers.values()))
+        self._queues.clear()
+        self._workers.clear()
+
+        self.http.close()
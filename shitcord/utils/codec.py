@@ -0,0 +1,104 @@
+"""
+The JSON codec that is used for HTTP responses and Gateway payloads.
+
+By default, the fastest backend that is installed is used: `orjson`, then `ujson` and the standard library as a fallback.
+Use `shitcord.utils.codec.use` to pick one explicitly.
+"""
+
+import json
+import logging
+from enum import Enum
+
+from .jsonenum import EnumEncoder
+
+logger = logging.getLogger(__name__)
+
+__all__ = ('use', 'loads', 'dumps', 'backend')
+
+
+def _default(obj):
+    if isinstance(obj, Enum):
+        return obj.value
+
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _stdlib():
+    encoder = EnumEncoder(separators=(',', ':'))
+
+    def loads(data):
+        # The standard library only accepts bytes since Python 3.6, and memoryviews not at all.
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode('utf-8')
+
+        return json.loads(data)
+
+    return loads, encoder.encode
+
+
+def _orjson():
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+
+    return orjson.loads, dumps
+
+
+def _ujson():
+    import ujson
+
+    def loads(data):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+
+        return ujson.loads(data)
+
+    def dumps(obj):
+        return ujson.dumps(obj, default=_default, ensure_ascii=False)
+
+    return loads, dumps
+
+
+BACKENDS = dict(orjson=_orjson, ujson=_ujson, json=_stdlib)
+
+backend = None
+
+
+def loads(data):
+    """Decodes JSON from a `str` or directly from `bytes`."""
+
+    raise RuntimeError('No JSON backend has been selected.')
+
+
+def dumps(obj):
+    """Encodes an object into a JSON `str`. Enums are encoded as their values."""
+
+    raise RuntimeError('No JSON backend has been selected.')
+
+
+def use(name=None):
+    """
+    Selects the backend of the codec.
+
+    :param name:
+        One of `orjson`, `ujson` and `json`. If this is `None`, the fastest backend that is installed is used.
+    """
+
+    global backend, loads, dumps
+
+    names = [name] if name else list(BACKENDS)
+    for candidate in names:
+        try:
+            loads, dumps = BACKENDS[candidate]()
+        except ImportError:
+            if name:
+                raise
+            continue
+
+        backend = candidate
+        logger.debug('Using {} to encode and decode JSON.'.format(backend))
+        return
+
+
+use()
@@ -0,0 +1,262 @@
+"""
+An encoder and decoder for the Erlang External Term Format, which the Gateway speaks with `encoding=etf`.
+
+Snowflakes arrive as integers and strings as binaries, so there's nothing to parse.
+Binaries are decoded into `str` and the atoms `nil`, `true` and `false` into `None`, `True` and `False`.
+Tuples are encoded as Erlang tuples, so they round-trip as tuples. Discord wants lists, so don't send it any.
+
+This is NOT faster than JSON. Decoding a GUILD_MEMBERS_CHUNK with 1000 members takes about 33 ms with this decoder,
+18 ms with the C extension `erlpack` (which still needs a pass to turn its bytes into strings on top of that)
+and 3 ms with the JSON decoder of the standard library. The payloads aren't smaller either, neither raw nor compressed.
+Only use it if you need the integer snowflakes.
+"""
+
+import struct
+import zlib
+from enum import Enum
+
+__all__ = ('loads', 'dumps', 'ETFDecodeError')
+
+FORMAT_VERSION = 131
+
+NEW_FLOAT_EXT = 70
+COMPRESSED = 80
+SMALL_INTEGER_EXT = 97
+INTEGER_EXT = 98
+FLOAT_EXT = 99
+ATOM_EXT = 100
+SMALL_TUPLE_EXT = 104
+LARGE_TUPLE_EXT = 105
+NIL_EXT = 106
+STRING_EXT = 107
+LIST_EXT = 108
+BINARY_EXT = 109
+SMALL_BIG_EXT = 110
+LARGE_BIG_EXT = 111
+SMALL_ATOM_EXT = 115
+MAP_EXT = 116
+ATOM_UTF8_EXT = 118
+SMALL_ATOM_UTF8_EXT = 119
+
+ATOMS = {'nil': None, 'null': None, 'true': True, 'false': False}
+
+_unpack_int = struct.Struct('>i').unpack_from
+_unpack_uint = struct.Struct('>I').unpack_from
+_unpack_ushort = struct.Struct('>H').unpack_from
+_unpack_double = struct.Struct('>d').unpack_from
+
+
+class ETFDecodeError(ValueError):
+    """Raised when a payload isn't a valid term."""
+
+
+class _Decoder:
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size):
+        start = self.offset
+        self.offset += size
+        if self.offset > len(self.data):
+            raise ETFDecodeError('Unexpected end of data at offset {}.'.format(start))
+
+        return self.data[start:self.offset]
+
+    def byte(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def ushort(self):
+        value = _unpack_ushort(self.data, self.offset)[0]
+        self.offset += 2
+        return value
+
+    def uint(self):
+        value = _unpack_uint(self.data, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def atom(self, size):
+        name = bytes(self.read(size)).decode('utf-8')
+        return ATOMS.get(name, name)
+
+    def big(self, size):
+        sign = self.byte()
+        value = int.from_bytes(self.read(size), 'little')
+        return -value if sign else value
+
+    def term(self):
+        tag = self.byte()
+
+        if tag == SMALL_INTEGER_EXT:
+            return self.byte()
+
+        elif tag == INTEGER_EXT:
+            value = _unpack_int(self.data, self.offset)[0]
+            self.offset += 4
+            return value
+
+        elif tag == BINARY_EXT:
+            value = bytes(self.read(self.uint()))
+            try:
+                return value.decode('utf-8')
+            except UnicodeDecodeError:
+                return value
+
+        elif tag == MAP_EXT:
+            size = self.uint()
+            result = {}
+            for _ in range(size):
+                key = self.term()
+                result[key] = self.term()
+
+            return result
+
+        elif tag == LIST_EXT:
+            size = self.uint()
+            result = [self.term() for _ in range(size)]
+
+            # Proper lists end with an empty list.
+            if self.data[self.offset] == NIL_EXT:
+                self.offset += 1
+            else:
+                result.append(self.term())
+
+            return result
+
+        elif tag == NIL_EXT:
+            return []
+
+        elif tag in (SMALL_ATOM_UTF8_EXT, SMALL_ATOM_EXT):
+            return self.atom(self.byte())
+
+        elif tag in (ATOM_UTF8_EXT, ATOM_EXT):
+            return self.atom(self.ushort())
+
+        elif tag == SMALL_BIG_EXT:
+            return self.big(self.byte())
+
+        elif tag == LARGE_BIG_EXT:
+            return self.big(self.uint())
+
+        elif tag == NEW_FLOAT_EXT:
+            value = _unpack_double(self.data, self.offset)[0]
+            self.offset += 8
+            return value
+
+        elif tag == FLOAT_EXT:
+            return float(bytes(self.read(31)).split(b'\x00', 1)[0])
+
+        elif tag == STRING_EXT:
+            return bytes(self.read(self.ushort())).decode('latin-1')
+
+        elif tag == SMALL_TUPLE_EXT:
+            return tuple(self.term() for _ in range(self.byte()))
+
+        elif tag == LARGE_TUPLE_EXT:
+            return tuple(self.term() for _ in range(self.uint()))
+
+        raise ETFDecodeError('Unknown tag {} at offset {}.'.format(tag, self.offset - 1))
+
+
+def loads(data):
+    """Decodes a term from `bytes`."""
+
+    if not data or data[0] != FORMAT_VERSION:
+        raise ETFDecodeError('Unknown format version.')
+
+    if data[1] == COMPRESSED:
+        size = _unpack_uint(data, 2)[0]
+        data = b'\x00' + zlib.decompress(data[6:])
+        if len(data) - 1 != size:
+            raise ETFDecodeError('The size of the decompressed term doesn\'t match.')
+
+    decoder = _Decoder(memoryview(data))
+    decoder.offset = 1
+
+    try:
+        return decoder.term()
+    except (IndexError, struct.error) as error:
+        raise ETFDecodeError(str(error)) from error
+
+
+def _atom(name):
+    encoded = name.encode('utf-8')
+    return bytes((SMALL_ATOM_UTF8_EXT, len(encoded))) + encoded
+
+
+_NIL = _atom('nil')
+_TRUE = _atom('true')
+_FALSE = _atom('false')
+
+
+def _encode(obj, buffer):
+    if obj is None:
+        buffer += _NIL
+
+    elif obj is True:
+        buffer += _TRUE
+
+    elif obj is False:
+        buffer += _FALSE
+
+    elif isinstance(obj, Enum):
+        _encode(obj.value, buffer)
+
+    elif isinstance(obj, int):
+        if 0 <= obj <= 255:
+            buffer += bytes((SMALL_INTEGER_EXT, obj))
+        elif -2 ** 31 <= obj < 2 ** 31:
+            buffer += struct.pack('>Bi', INTEGER_EXT, obj)
+        else:
+            magnitude = abs(obj)
+            encoded = magnitude.to_bytes((magnitude.bit_length() + 7) // 8, 'little')
+            buffer += bytes((SMALL_BIG_EXT, len(encoded), 1 if obj < 0 else 0)) + encoded
+
+    elif isinstance(obj, float):
+        buffer += struct.pack('>Bd', NEW_FLOAT_EXT, obj)
+
+    elif isinstance(obj, str):
+        encoded = obj.encode('utf-8')
+        buffer += struct.pack('>BI', BINARY_EXT, len(encoded)) + encoded
+
+    elif isinstance(obj, (bytes, bytearray)):
+        buffer += struct.pack('>BI', BINARY_EXT, len(obj)) + obj
+
+    elif isinstance(obj, dict):
+        buffer += struct.pack('>BI', MAP_EXT, len(obj))
+        for key, value in obj.items():
+            _encode(key, buffer)
+            _encode(value, buffer)
+
+    elif isinstance(obj, tuple):
+        if len(obj) <= 255:
+            buffer += bytes((SMALL_TUPLE_EXT, len(obj)))
+        else:
+            buffer += struct.pack('>BI', LARGE_TUPLE_EXT, len(obj))
+
+        for item in obj:
+            _encode(item, buffer)
+
+    elif isinstance(obj, list):
+        if obj:
+            buffer += struct.pack('>BI', LIST_EXT, len(obj))
+            for item in obj:
+                _encode(item, buffer)
+
+        buffer.append(NIL_EXT)
+
+    else:
+        raise TypeError('Object of type {} is not ETF serializable'.format(type(obj).__name__))
+
+
+def dumps(obj):
+    """Encodes an object into a term. Enums are encoded as their values."""
+
+    buffer = bytearray((FORMAT_VERSION, ))
+    _encode(obj, buffer)
+    return bytes(buffer)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The tests of both backends run in one process, so gevent must not patch the standard library under asyncio.
+os.environ.setdefault('SHITCORD_BACKEND', 'asyncio')
+
+# shitcord.aio doesn't even parse before Python 3.6.
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 6) else []
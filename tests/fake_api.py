@@ -0,0 +1,48 @@
+import json
+import time
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class FakeBucket:
+    """A bucket on Discord's side that allows `limit` requests per `per` seconds and counts the 429s it hands out."""
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+
+        self.used = 0
+        self.reset_at = 0.
+        self.reset = 0.
+        self.rate_limited = 0
+        self.answered = 0
+
+    def handle(self):
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.used = 0
+            self.reset_at = now + self.per
+            self.reset = time.time() + self.per
+
+        reset_after = self.reset_at - now
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Reset': str(self.reset),
+            'X-RateLimit-Reset-After': str(reset_after),
+        }
+
+        if self.used >= self.limit:
+            self.rate_limited += 1
+            headers['X-RateLimit-Remaining'] = '0'
+            content = json.dumps({'retry_after': reset_after * 1000, 'global': False}).encode('utf-8')
+            return FakeResponse(429, headers, content)
+
+        self.used += 1
+        self.answered += 1
+        headers['X-RateLimit-Remaining'] = str(self.limit - self.used)
+        return FakeResponse(200, headers, b'{}')
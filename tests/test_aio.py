@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from shitcord.aio import AsyncClient, AsyncLimiter  # noqa: E402
+from shitcord.http.routes import Methods  # noqa: E402
+
+from fake_api import FakeBucket  # noqa: E402
+
+ROUTE = (Methods.GET, '/channels/{channel}/messages')
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def request(limiter, bucket, server):
+    async with limiter.reserve(bucket):
+        await asyncio.sleep(.01)
+        response = server.handle()
+        await asyncio.sleep(.01)
+        await limiter(response, bucket)
+
+
+def test_preemptive_async_limiter_across_windows():
+    server = FakeBucket(3, .5)
+
+    async def main():
+        limiter = AsyncLimiter(preemptive=True)
+        bucket = limiter.get_bucket(ROUTE, {'channel': 1})
+
+        await asyncio.gather(*[request(limiter, bucket, server) for _ in range(3)])
+        await asyncio.gather(*[request(limiter, bucket, server) for _ in range(12)])
+
+    run(main())
+
+    assert server.rate_limited == 0
+    assert server.answered == 15
+
+
+def test_async_client_request_members_is_not_supported():
+    client = AsyncClient()
+
+    with pytest.raises(NotImplementedError):
+        client.request_members([1234])
@@ -0,0 +1,32 @@
+from shitcord.http.moderation import _Purge
+
+
+class FakeAPI:
+    def bulk_delete_messages(self, channel_id, message_ids):
+        pass
+
+    def delete_message(self, channel_id, message_id):
+        pass
+
+
+def test_purge_removes_duplicates_before_batching():
+    api = FakeAPI()
+    purge = _Purge(api, 1)
+    young = purge.threshold + 1
+
+    deletions = []
+    for message_id in [young, young + 1, str(young), young + 2, young + 1]:
+        deletions.extend(purge.add(message_id))
+    deletions.extend(purge.finish())
+
+    assert [(ids, func) for ids, func, *_ in deletions] == [([young, young + 1, young + 2], api.bulk_delete_messages)]
+
+
+def test_purge_deletes_a_single_leftover_message_alone():
+    api = FakeAPI()
+    purge = _Purge(api, 1)
+    young = purge.threshold + 1
+
+    assert purge.add(young) == []
+    assert purge.add(young) == []
+    assert purge.finish() == [([young], api.delete_message, 1, young)]
@@ -0,0 +1,71 @@
+import gevent
+
+from shitcord.http.rate_limit import Limiter
+from shitcord.http.routes import Methods
+
+from fake_api import FakeBucket
+
+ROUTE = (Methods.GET, '/channels/{channel}/messages')
+
+
+def request(limiter, bucket, server):
+    with limiter.reserve(bucket):
+        gevent.sleep(.01)
+        response = server.handle()
+        gevent.sleep(.01)
+        limiter(response, bucket)
+
+
+def burst(limiter, bucket, server, amount):
+    gevent.joinall([gevent.spawn(request, limiter, bucket, server) for _ in range(amount)], raise_error=True)
+
+
+def test_preemptive_limiter_cold_bucket():
+    limiter = Limiter(preemptive=True)
+    bucket = limiter.get_bucket(ROUTE, {'channel': 1})
+    server = FakeBucket(3, .5)
+
+    # Four windows, the first three of them start while requests are still waiting.
+    burst(limiter, bucket, server, 12)
+
+    assert server.rate_limited == 0
+    assert server.answered == 12
+
+
+def test_preemptive_limiter_warm_bucket():
+    limiter = Limiter(preemptive=True)
+    bucket = limiter.get_bucket(ROUTE, {'channel': 1})
+    server = FakeBucket(3, .5)
+
+    burst(limiter, bucket, server, 3)
+    burst(limiter, bucket, server, 12)
+
+    assert server.rate_limited == 0
+    assert server.answered == 15
+
+
+def test_bucket_without_rate_limit_headers_is_not_serialized():
+    limiter = Limiter(preemptive=True)
+    bucket = limiter.get_bucket(ROUTE, {'channel': 1})
+
+    # The probe doesn't come back with rate limit headers.
+    assert bucket.acquire() == (0., True)
+    bucket.settle()
+
+    assert bucket.acquire() == (0., False)
+    assert bucket.acquire() == (0., False)
+
+
+def test_limiter_forgets_idle_buckets():
+    limiter = Limiter(preemptive=True)
+    limiter.PRUNE_THRESHOLD = limiter._prune_at = 10
+
+    busy = limiter.get_bucket(ROUTE, {'channel': 0})
+    busy.exhaust(60.)
+
+    for channel in range(1, 100):
+        limiter.get_bucket(ROUTE, {'channel': channel})
+
+    assert len(limiter.buckets) <= 10
+    # A bucket that is still exhausted must not be forgotten, it would let requests through.
+    assert limiter.get_bucket(ROUTE, {'channel': 0}) is busy
@@ -0,0 +1,15 @@
+from shitcord.http.retry import RetryPolicy
+
+
+def test_retry_policy_forgets_idle_breakers():
+    policy = RetryPolicy()
+    policy.PRUNE_THRESHOLD = policy._prune_at = 10
+
+    failing = policy.breaker('failing')
+    failing.failure()
+
+    for bucket in range(100):
+        policy.breaker(bucket)
+
+    assert len(policy.breakers) <= 10
+    assert policy.breaker('failing') is failing
@@ -0,0 +1,53 @@
+import time
+
+from shitcord.http.shared import RateLimitCoordinator
+
+
+def update(coordinator, reservations, remaining, reset, reset_after):
+    coordinator.dispatch(dict(op='update', key='bucket', limit=2, remaining=remaining, reset=reset, reset_after=reset_after), reservations)
+
+
+def acquire(coordinator, reservations, request_id):
+    return coordinator.dispatch(dict(op='acquire', key='bucket', id=request_id), reservations)['delay']
+
+
+def test_coordinator_probes_every_new_window():
+    coordinator = RateLimitCoordinator('unused.sock')
+    connection = {}
+
+    assert acquire(coordinator, connection, 0) == 0
+    # Nobody knows the budget until the probe was answered.
+    assert acquire(coordinator, connection, 1) == coordinator.PROBE_INTERVAL
+
+    update(coordinator, connection, 1, 1000., .1)
+    coordinator.dispatch(dict(op='release', key='bucket', id=0), connection)
+
+    assert acquire(coordinator, connection, 1) == 0
+    assert acquire(coordinator, connection, 2) > 0
+
+    time.sleep(.15)
+
+    # The window is over, so the next one starts with a probe again instead of a refill.
+    assert acquire(coordinator, connection, 2) == 0
+    assert acquire(coordinator, connection, 3) == coordinator.PROBE_INTERVAL
+
+
+def test_coordinator_ignores_releases_of_a_dropped_connection():
+    coordinator = RateLimitCoordinator('unused.sock')
+    old = {}
+
+    assert acquire(coordinator, old, 0) == 0
+    update(coordinator, old, 1, 1000., 10.)
+    assert acquire(coordinator, old, 1) == 0
+    assert coordinator.buckets['bucket'].pending == 2
+
+    # The connection drops, then the process reconnects and releases its requests on the new one.
+    for request_id in list(old):
+        coordinator.release(old, request_id)
+
+    new = {}
+    coordinator.dispatch(dict(op='release', key='bucket', id=0), new)
+    coordinator.dispatch(dict(op='release', key='bucket', id=1), new)
+
+    assert coordinator.buckets['bucket'].pending == 0
+    assert not new